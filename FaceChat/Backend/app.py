@@ -1,7 +1,20 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import auth, conversation
+from pkg.inference.executor import inference_executor
+from pkg.lifecycle.startup import startup_state, STARTUP_MODE
+from database import dispose_engines
+from pkg.conversation.persistence import turn_writer
+from pkg.inference.batching import batchers, batching_metrics
+from pkg.inference.cache import cache_stats
+from pkg.llm.client import llm_stats
+from pkg.observability.metrics import MetricsMiddleware, callback_collector, configure_tracing
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from starlette.middleware.sessions import SessionMiddleware
+import asyncio
 import logging
 from dotenv import load_dotenv
 import os
@@ -9,12 +22,34 @@ import os
 
 load_dotenv()
 
-app = FastAPI()
-
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import: models, schema and the identification index are loaded here
+    configure_tracing()
+    await turn_writer.start()
+    startup = None
+    if STARTUP_MODE == "blocking":
+        await startup_state.start()
+    else:
+        startup = asyncio.create_task(startup_state.start())
+    yield
+    if startup is not None and not startup.done():
+        startup.cancel()
+    # Flush queued conversation turns while the inference executor is still running
+    await turn_writer.stop()
+    for batcher in batchers:
+        await batcher.stop()
+    inference_executor.shutdown()
+    await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
 # Add the session middleware
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_KEY"))
 
@@ -34,7 +69,63 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the recorded latency covers the session and CORS middleware too
+app.add_middleware(MetricsMiddleware)
+
+# Queue depths read when /metrics is scraped
+callback_collector.add("facechat_executor_pending", "Inference calls submitted to the executor and not finished", "executor",
+                       lambda: {inference_executor.kind: inference_executor.pending})
+callback_collector.add("facechat_executor_queue_depth", "Inference calls waiting for an executor worker", "executor",
+                       lambda: {inference_executor.kind: inference_executor.queue_depth})
+callback_collector.add("facechat_batcher_queue_depth", "Items waiting in a micro-batcher", "batcher",
+                       lambda: {batcher.name: batcher.queue_depth for batcher in batchers})
+callback_collector.add("facechat_turn_writer_queue_depth", "Conversation turns waiting to be stored", "writer",
+                       lambda: {"turns": turn_writer.queue_depth})
+
 
 @app.get("/")
 def read_root():
-    return {"message": "FaceChat API"}
\ No newline at end of file
+    return {"message": "FaceChat API"}
+
+
+@app.get("/healthz")
+def read_liveness():
+    # Liveness: the worker's event loop answers, whether or not startup has finished, unless
+    # startup failed for good; then the worker can only recover by being restarted
+    if startup_state.failed:
+        return JSONResponse({"status": "startup_failed"}, status_code=503)
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def read_readiness():
+    # Readiness: every startup step finished and the database answers
+    report = startup_state.report()
+    report["database_error"] = await startup_state.check_database()
+    ready = report["ready"] and report["database_error"] is None
+    return JSONResponse(report, status_code=200 if ready else 503)
+
+
+@app.get("/inference/batching")
+def read_batching_metrics():
+    # Batch size distribution and queue wait of every micro-batcher in this worker
+    return batching_metrics()
+
+
+
+@app.get("/inference/cache")
+def read_cache_stats():
+    # Hit/miss counters of the content-addressed inference caches in this worker
+    return cache_stats()
+
+
+@app.get("/inference/llm")
+def read_llm_stats():
+    # Backend calls, coalesced prompts and response cache counters of every LLM client in this worker
+    return llm_stats()
+
+
+@app.get("/metrics")
+def read_metrics():
+    # Prometheus exposition of this worker's stage histograms, in-flight gauges, model load times and queue depths
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,67 @@
+"""Measures face detection throughput over a fixed set of images.
+
+Every image in the directory is decoded once up front; each configured detector then
+runs over the whole set for several rounds. Reports detections per second and how
+many images yielded exactly one face (what verify/register accept).
+
+    python benchmarks/bench_face_detection.py path/to/images --rounds 5
+    python benchmarks/bench_face_detection.py path/to/images --yunet-model face_detection_yunet_2023mar.onnx
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+from pkg.recognition.face_detection import HaarFaceDetector, YuNetFaceDetector
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def load_images(directory: str) -> list:
+    images = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            image = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append(image)
+    return images
+
+
+def bench(name: str, detector, images: list, rounds: int):
+    single_face = sum(len(detector.detect(image)) == 1 for image in images)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for image in images:
+            detector.detect(image)
+    elapsed = time.perf_counter() - start
+    rate = rounds * len(images) / elapsed
+    print(f"{name:<32} {rate:8.1f} detections/s  single-face {single_face}/{len(images)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("images", help="directory of test images")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--yunet-model", help="path to the YuNet ONNX model to include it in the comparison")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        sys.exit(f"No images found in {args.images}")
+    print(f"{len(images)} images, {args.rounds} rounds")
+
+    detectors = {
+        "haar full-res minNeighbors=2": HaarFaceDetector(min_neighbors=2, max_dimension=100000),
+        "haar full-res minNeighbors=5": HaarFaceDetector(min_neighbors=5, max_dimension=100000),
+        "haar 640px minNeighbors=5": HaarFaceDetector(min_neighbors=5, max_dimension=640),
+        "haar 320px minNeighbors=5": HaarFaceDetector(min_neighbors=5, max_dimension=320),
+    }
+    if args.yunet_model:
+        detectors["yunet 640px"] = YuNetFaceDetector(args.yunet_model, max_dimension=640)
+        detectors["yunet 320px"] = YuNetFaceDetector(args.yunet_model, max_dimension=320)
+
+    for name, detector in detectors.items():
+        bench(name, detector, images, args.rounds)
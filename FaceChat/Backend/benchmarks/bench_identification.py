@@ -0,0 +1,129 @@
+"""Compares the in-memory identification index with the SQL identification query.
+
+Synthetic mode (default) times IdentificationIndex.search over a random population,
+and the cascade (face shortlist, voice only for ambiguous faces, see VERIFY_MODE) on
+the same probes.
+With --sql the index is loaded from the live users table and both paths answer the
+same probes, so latency and agreement can be compared on real data.
+
+    python benchmarks/bench_identification.py --users 1000 100000 1000000 --output results/identification.json
+    python benchmarks/bench_identification.py --sql --queries 200 --output results/identification_sql.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from models.user import FACE_EMBEDDING_DIM, VOICE_EMBEDDING_DIMS
+from benchmarks.results import Results, summarize
+from pkg.recognition.identification_index import IdentificationIndex
+from pkg.recognition.cascade import CASCADE_FACE_TOP_K, decide_on_face, decide_on_voice
+
+
+def make_probes(faces, voices, count, rng, noise=0.05):
+    picks = rng.integers(0, len(faces), size=count)
+    face_probes = faces[picks] + rng.normal(0, noise, size=(count, faces.shape[1])).astype(np.float32)
+    voice_probes = voices[picks] + rng.normal(0, noise, size=(count, voices.shape[1])).astype(np.float32)
+    return picks, face_probes, voice_probes
+
+
+def bench_synthetic(results: Results, users: int, queries: int, seed: int, voice_version: int):
+    rng = np.random.default_rng(seed)
+    faces = rng.normal(size=(users, FACE_EMBEDDING_DIM)).astype(np.float32)
+    voices = rng.normal(size=(users, VOICE_EMBEDDING_DIMS[voice_version])).astype(np.float32)
+    user_ids = np.arange(1, users + 1)
+
+    index = IdentificationIndex(initial_capacity=users)
+    start = time.perf_counter()
+    index.add_many(user_ids, faces, voices, np.full(users, voice_version), [(int(user_id),) for user_id in user_ids])
+    print(f"built index of {users} users in {time.perf_counter() - start:.2f}s")
+
+    picks, face_probes, voice_probes = make_probes(faces, voices, queries, rng)
+    timings, correct = [], 0
+    for pick, face, voice in zip(picks, face_probes, voice_probes):
+        start = time.perf_counter()
+        match = index.search(face, {voice_version: voice})
+        timings.append(time.perf_counter() - start)
+        correct += match is not None and match[0] == user_ids[pick]
+    results.add(f"identification.index_{users}", summarize(timings), accuracy=round(correct / queries, 4))
+
+    # Cascade: face shortlist, voice scored against the shortlist only when the face is ambiguous
+    timings, correct, face_decided = [], 0, 0
+    for pick, face, voice in zip(picks, face_probes, voice_probes):
+        start = time.perf_counter()
+        candidates = index.shortlist(face, CASCADE_FACE_TOP_K)
+        decision = decide_on_face(candidates)
+        if decision is None:
+            decision = decide_on_voice(candidates, {voice_version: voice})
+        else:
+            face_decided += 1
+        timings.append(time.perf_counter() - start)
+        match = decision[1]
+        correct += match is not None and match[0] == user_ids[pick]
+    results.add(
+        f"identification.cascade_{users}", summarize(timings),
+        accuracy=round(correct / queries, 4), face_decided=round(face_decided / queries, 4),
+    )
+
+
+def bench_sql(results: Results, queries: int, seed: int):
+    from database import SessionLocal
+    from routes.auth import find_similar_embeddings
+
+    rng = np.random.default_rng(seed)
+    db = SessionLocal()
+    try:
+        index = IdentificationIndex()
+        start = time.perf_counter()
+        index.load(db)
+        print(f"loaded index of {len(index)} users in {time.perf_counter() - start:.2f}s")
+        if not len(index):
+            print("users table is empty, nothing to compare")
+            return
+
+        _, faces, voices, voice_versions = index.snapshot()
+        picks, face_probes, voice_probes = make_probes(faces, voices, queries, rng, noise=0.01)
+        index_timings, sql_timings, agree = [], [], 0
+        for pick, face, voice in zip(picks, face_probes, voice_probes):
+            # Probe in the enrolled user's own voice version, trimmed from the padded row
+            version = int(voice_versions[pick])
+            probes = {version: voice[:VOICE_EMBEDDING_DIMS[version]]}
+            start = time.perf_counter()
+            index_match = index.search(face, probes)
+            index_timings.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            sql_match = find_similar_embeddings(db, face.reshape(1, -1), probes)
+            sql_timings.append(time.perf_counter() - start)
+            db.rollback()
+
+            index_id = index_match[0] if index_match else None
+            sql_id = sql_match[0] if isinstance(sql_match, tuple) else None
+            agree += index_id == sql_id
+        results.add(f"identification.index_live_{len(index)}", summarize(index_timings),
+                    agreement=round(agree / queries, 4))
+        results.add(f"identification.sql_live_{len(index)}", summarize(sql_timings))
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[100000], help="synthetic population sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--voice-version", type=int, default=1, choices=sorted(VOICE_EMBEDDING_DIMS),
+                        help="voice embedding version of the synthetic population")
+    parser.add_argument("--sql", action="store_true", help="compare against the SQL path on the live database")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+    results = Results("identification", {key: value for key, value in vars(args).items() if key != "output"})
+    if args.sql:
+        bench_sql(results, args.queries, args.seed)
+    else:
+        for users in args.users:
+            bench_synthetic(results, users, args.queries, args.seed, args.voice_version)
+    results.write(args.output)
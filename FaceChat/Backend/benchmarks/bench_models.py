@@ -0,0 +1,145 @@
+"""Microbenchmarks of the per-request model calls, run in-process without the server.
+
+face       FaceRecognition.recognize_face (detect + embed) over the images in --images;
+           without images only the embedding of synthetic face crops is measured
+voice      extract_voice_features for every voice embedding version, one clip per call
+           and through the batch API
+whisper    transcription of the clips in --audio, or of synthetic clips
+sentence   sentence embedding of one utterance, as used by context extraction
+
+    python benchmarks/bench_models.py --images faces/ --audio clips/ --output results/models.json
+    python benchmarks/bench_models.py --only voice whisper --clip-seconds 5
+"""
+import argparse
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.results import Results, summarize, time_calls
+
+SAMPLE_RATE = 16000
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+AUDIO_EXTENSIONS = (".webm", ".wav", ".mp3", ".ogg", ".m4a", ".flac")
+
+
+def synthetic_clips(count: int, seconds: float, rng) -> list:
+    """Voiced-like clips: a few harmonics of a random pitch with noise and an amplitude envelope."""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    clips = []
+    for _ in range(count):
+        pitch = rng.uniform(90, 250)
+        clip = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        clip *= 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t) ** 2
+        clip += rng.normal(0, 0.05, size=t.shape)
+        clips.append((0.3 * clip / np.abs(clip).max()).astype(np.float32))
+    return clips
+
+
+def load_audio(directory: str) -> list:
+    from pkg.audio.ingest import decode_to_pcm
+    clips = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(AUDIO_EXTENSIONS):
+            with open(os.path.join(directory, name), "rb") as audio_file:
+                clips.append(decode_to_pcm(audio_file.read()))
+    return clips
+
+
+def bench_face(results: Results, args, rng):
+    from pkg.recognition.face_recognition import face_recognition
+
+    if args.images:
+        images = []
+        for name in sorted(os.listdir(args.images)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(args.images, name), "rb") as image_file:
+                    images.append(image_file.read())
+
+        def recognize(image_bytes):
+            try:
+                face_recognition.recognize_face(io.BytesIO(image_bytes))
+            except ValueError:
+                pass  # no face or several faces, still a measured request
+
+        samples = time_calls(recognize, [(image,) for image in images * args.rounds])
+        results.add("face.recognize_face", summarize(samples), images=len(images))
+
+    crops = [rng.integers(0, 255, size=(160, 160, 3), dtype=np.uint8) for _ in range(args.batch_size)]
+    samples = time_calls(face_recognition.extract_face_embedding, [(crop,) for crop in crops * args.rounds])
+    results.add("face.embedding", summarize(samples))
+    samples = time_calls(face_recognition.extract_face_embeddings, [(crops,)] * args.rounds)
+    results.add(f"face.embedding_batch{len(crops)}", summarize(samples, items=len(crops)))
+
+
+def bench_voice(results: Results, args, clips: list):
+    from pkg.inference.model_registry import model_registry
+    from pkg.recognition.voice_recognition import VOICE_MODES
+
+    featurizer = model_registry.voice_featurizer
+    versions = args.voice_versions or sorted(VOICE_MODES)
+    batch = clips[:args.batch_size]
+    for version in versions:
+        samples = time_calls(
+            featurizer.extract_voice_features, [(clip, SAMPLE_RATE, version) for clip in clips * args.rounds]
+        )
+        results.add(f"voice.v{version}", summarize(samples))
+        samples = time_calls(featurizer.extract_voice_features_batch, [(batch, SAMPLE_RATE, version)] * args.rounds)
+        results.add(f"voice.v{version}_batch{len(batch)}", summarize(samples, items=len(batch)))
+
+
+def bench_whisper(results: Results, args, clips: list):
+    from pkg.inference.batching import transcribe_batch
+    from pkg.inference.model_registry import transcribe, WHISPER_MODEL_NAME
+
+    samples = time_calls(transcribe, [(clip,) for clip in clips])
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    results.add(
+        f"whisper.{WHISPER_MODEL_NAME}", summarize(samples),
+        realtime_factor=round(sum(samples) / audio_seconds, 4),
+    )
+    batch = clips[:args.batch_size]
+    samples = time_calls(transcribe_batch, [(batch,)] * max(1, args.rounds // 2))
+    results.add(f"whisper.{WHISPER_MODEL_NAME}_batch{len(batch)}", summarize(samples, items=len(batch)))
+
+
+def bench_sentence(results: Results, args):
+    from pkg.inference.model_registry import model_registry
+    encoder = model_registry.sentence_encoder
+    sentences = [f"what did we talk about regarding topic number {i} last week" for i in range(args.batch_size)]
+    samples = time_calls(lambda s: encoder.encode([s], normalize_embeddings=True), [(s,) for s in sentences * args.rounds])
+    results.add("sentence.encode", summarize(samples))
+    samples = time_calls(lambda batch: encoder.encode(batch, normalize_embeddings=True), [(sentences,)] * args.rounds)
+    results.add(f"sentence.encode_batch{len(sentences)}", summarize(samples, items=len(sentences)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=["face", "voice", "whisper", "sentence"])
+    parser.add_argument("--images", help="directory of face images for recognize_face")
+    parser.add_argument("--audio", help="directory of voice clips; synthetic clips are used otherwise")
+    parser.add_argument("--clips", type=int, default=16, help="number of synthetic clips")
+    parser.add_argument("--clip-seconds", type=float, default=4.0)
+    parser.add_argument("--voice-versions", type=int, nargs="+")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    selected = set(args.only or ["face", "voice", "whisper", "sentence"])
+    clips = load_audio(args.audio) if args.audio else synthetic_clips(args.clips, args.clip_seconds, rng)
+    results = Results("models", {key: value for key, value in vars(args).items() if key != "output"})
+
+    if "face" in selected:
+        bench_face(results, args, rng)
+    if "voice" in selected:
+        bench_voice(results, args, clips)
+    if "whisper" in selected:
+        bench_whisper(results, args, clips)
+    if "sentence" in selected:
+        bench_sentence(results, args)
+    results.write(args.output)
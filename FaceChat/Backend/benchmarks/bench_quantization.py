@@ -0,0 +1,127 @@
+"""Speed and accuracy of the int8 / ONNX inference backends against the fp32 torch path.
+
+sentence   encodes --sentences (or built-in questions) with every backend; records the
+           latency and the cosine similarity of each embedding to its fp32 embedding
+whisper    transcribes the clips in --audio with every backend; records the latency,
+           the realtime factor and the word error rate against the fp32 transcript
+           (and against --references, a CSV of file,transcript, when given)
+
+Exits with status 1 when a backend drifts beyond --min-cosine or --max-wer, so a
+backend change can be gated in CI. Thread counts come from SENTENCE_THREADS,
+WHISPER_THREADS and TORCH_NUM_THREADS and are recorded with the results.
+
+    python benchmarks/bench_quantization.py --audio clips/ --backends int8 onnx --output results/quantization.json
+    TORCH_NUM_THREADS=2 python benchmarks/bench_quantization.py --only sentence --backends int8
+"""
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from benchmarks.results import Results, summarize, time_calls
+from benchmarks.bench_models import load_audio, SAMPLE_RATE, AUDIO_EXTENSIONS
+from pkg.inference.backends import load_sentence_encoder, load_whisper, cosine_similarities, word_error_rate
+from pkg.inference.model_registry import SENTENCE_MODEL_NAME, WHISPER_MODEL_NAME
+
+DEFAULT_SENTENCES = [
+    "what did we talk about last week",
+    "can you remind me of the name of my sister's dog",
+    "I would like to plan a trip to the mountains in spring",
+    "how many hours did I say I sleep on weekdays",
+    "tell me again which book you recommended to me",
+    "my favourite food is a spicy vegetable curry",
+    "what is the weather usually like in the city I live in",
+    "I started learning the guitar two months ago",
+]
+
+
+def bench_sentence(results: Results, args, backends: list) -> list:
+    sentences = DEFAULT_SENTENCES
+    if args.sentences:
+        with open(args.sentences) as sentence_file:
+            sentences = [line.strip() for line in sentence_file if line.strip()]
+    failures, reference = [], None
+    for backend in ["torch"] + backends:
+        encoder = load_sentence_encoder(SENTENCE_MODEL_NAME, backend)
+        encode = lambda batch: encoder.encode(batch, normalize_embeddings=True)
+        embeddings = np.asarray(encode(sentences), dtype=np.float32)
+        samples = time_calls(encode, [([s],) for s in sentences * args.rounds])
+        extra = {}
+        if reference is None:
+            reference = embeddings
+        else:
+            similarities = cosine_similarities(reference, embeddings)
+            extra = {"cosine_mean": round(float(similarities.mean()), 6), "cosine_min": round(float(similarities.min()), 6)}
+            if similarities.min() < args.min_cosine:
+                failures.append(f"sentence.{backend} cosine_min {similarities.min():.4f} < {args.min_cosine}")
+        results.add(f"sentence.{backend}", summarize(samples), **extra)
+        batch_samples = time_calls(encode, [(sentences,)] * args.rounds)
+        results.add(f"sentence.{backend}_batch{len(sentences)}", summarize(batch_samples, items=len(sentences)))
+        del encoder
+    return failures
+
+
+def load_references(path: str) -> dict:
+    with open(path, newline="") as reference_file:
+        return {row["file"]: row["transcript"] for row in csv.DictReader(reference_file)}
+
+
+def bench_whisper(results: Results, args, backends: list) -> list:
+    names = sorted(name for name in os.listdir(args.audio) if name.lower().endswith(AUDIO_EXTENSIONS))
+    clips = load_audio(args.audio)
+    references = load_references(args.references) if args.references else {}
+    audio_seconds = sum(len(clip) for clip in clips) / SAMPLE_RATE
+    failures, fp32_transcripts = [], None
+    for backend in ["torch"] + backends:
+        model = load_whisper(WHISPER_MODEL_NAME, backend)
+        transcripts = []
+        transcribe = lambda clip: transcripts.append(model.transcribe(clip, fp16=False)["text"])
+        samples = time_calls(transcribe, [(clip,) for clip in clips], warmup=0)
+        extra = {"realtime_factor": round(sum(samples) / audio_seconds, 4)}
+        if fp32_transcripts is None:
+            fp32_transcripts = transcripts
+        else:
+            wer = float(np.mean([word_error_rate(ref, hyp) for ref, hyp in zip(fp32_transcripts, transcripts)]))
+            extra["wer_vs_fp32"] = round(wer, 4)
+            if wer > args.max_wer:
+                failures.append(f"whisper.{backend} wer_vs_fp32 {wer:.4f} > {args.max_wer}")
+        if references:
+            scored = [(references[name], text) for name, text in zip(names, transcripts) if name in references]
+            if scored:
+                extra["wer_vs_references"] = round(float(np.mean([word_error_rate(ref, hyp) for ref, hyp in scored])), 4)
+        results.add(f"whisper.{WHISPER_MODEL_NAME}.{backend}", summarize(samples), **extra)
+        del model
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=["sentence", "whisper"])
+    parser.add_argument("--backends", nargs="+", choices=["int8", "onnx"], default=["int8", "onnx"],
+                        help="backends compared with the fp32 torch path")
+    parser.add_argument("--sentences", help="text file with one sentence per line")
+    parser.add_argument("--audio", help="directory of speech clips for the Whisper comparison")
+    parser.add_argument("--references", help="CSV with file,transcript columns for the clips in --audio")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="lowest accepted cosine to the fp32 embedding")
+    parser.add_argument("--max-wer", type=float, default=0.05, help="highest accepted mean WER against fp32")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    selected = set(args.only or ["sentence", "whisper"])
+    results = Results("quantization", {key: value for key, value in vars(args).items() if key != "output"})
+    failures = []
+    if "sentence" in selected:
+        failures += bench_sentence(results, args, args.backends)
+    if "whisper" in selected:
+        if args.audio:
+            failures += bench_whisper(results, args, args.backends)
+        else:
+            print("whisper skipped: --audio is required, WER of synthetic clips is meaningless")
+    results.write(args.output)
+    if failures:
+        print("accuracy check failed: " + "; ".join(failures))
+        sys.exit(1)
@@ -0,0 +1,206 @@
+"""Benchmarks the SQL identification query and context extraction on synthetic populations.
+
+Synthetic users (contact "bench") are COPYed into the database configured by
+DATABASE_URL until each requested population size is reached, so populations are
+measured from smallest to largest on one growing table. Point DATABASE_URL at a
+scratch database: --cleanup removes the synthetic users (and their turns) afterwards.
+
+For every population, find_similar_embeddings answers probes made from enrolled
+embeddings plus noise. --turn-users synthetic users then get --turns conversation
+turns each, and context_extraction runs for one of them with probes close to its
+turns; the recall of its similar turns against an exact scan is recorded, so turns
+of other users crowding out the caller's show up.
+
+    DATABASE_URL=postgresql+psycopg2://postgres:pw@localhost/bench \\
+        python benchmarks/bench_search.py --users 1000 100000 1000000 --output results/search.json
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import text, select, func
+from benchmarks.results import Results, summarize
+from database import engine, SessionLocal, create_schema
+from pkg.storage.embeddings import as_embedding, copy_rows
+from models.user import User, FACE_EMBEDDING_DIM, VOICE_EMBEDDING_DIMS
+from models.conversation import ConversationTurn, SENTENCE_EMBEDDING_DIM
+
+BENCH_CONTACT = "bench"
+COPY_CHUNK = 50000
+
+
+def bench_user_count() -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM users WHERE contact = :contact"), {"contact": BENCH_CONTACT}).scalar()
+
+
+def seed_users(target: int, voice_version: int, rng):
+    existing = bench_user_count()
+    dim = VOICE_EMBEDDING_DIMS[voice_version]
+    start = time.perf_counter()
+    while existing < target:
+        count = min(COPY_CHUNK, target - existing)
+        faces = rng.normal(size=(count, FACE_EMBEDDING_DIM)).astype(np.float32)
+        voices = rng.normal(size=(count, dim)).astype(np.float32)
+        copy_rows(
+            "users",
+            ["name", "age", "gender", "contact", "face_image", "voice_sample", "voice_version"],
+            ["text", "int4", "text", "text", "embedding", "embedding", "int4"],
+            (
+                (f"bench-{existing + i}", 30, "n/a", BENCH_CONTACT, face, voice, voice_version)
+                for i, (face, voice) in enumerate(zip(faces, voices))
+            ),
+        )
+        existing += count
+        print(f"  seeded {existing}/{target} users")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE users"))
+    return time.perf_counter() - start
+
+
+def sample_users(count: int, rng):
+    """Random enrolled bench users as (user_id, face, voice, voice_version)."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(User.user_id, User.face_image, User.voice_sample, User.voice_version)
+            .where(User.contact == BENCH_CONTACT)
+            .order_by(func.random())
+            .limit(count)
+        ).all()
+    finally:
+        db.close()
+    return [
+        (row.user_id, as_embedding(row.face_image), as_embedding(row.voice_sample), row.voice_version)
+        for row in rows
+    ]
+
+
+def bench_identification(results: Results, population: int, queries: int, rng):
+    from routes.auth import find_similar_embeddings
+
+    db = SessionLocal()
+    samples, correct = [], 0
+    try:
+        for user_id, face, voice, version in sample_users(queries, rng):
+            face_probe = face + rng.normal(0, 0.05, size=face.shape).astype(np.float32)
+            voice_probe = voice + rng.normal(0, 0.05, size=voice.shape).astype(np.float32)
+            start = time.perf_counter()
+            match = find_similar_embeddings(db, face_probe.reshape(1, -1), {version: voice_probe})
+            samples.append(time.perf_counter() - start)
+            db.rollback()
+            correct += isinstance(match, tuple) and match[0] == user_id
+    finally:
+        db.close()
+    results.add(f"identification.sql_{population}", summarize(samples), accuracy=round(correct / len(samples), 4))
+
+
+def seed_turns(user_id: int, turns: int, rng):
+    embeddings = rng.normal(size=(turns, 2, SENTENCE_EMBEDDING_DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    copy_rows(
+        ConversationTurn.__tablename__,
+        ["user_id", "conversation", "query_embedding", "response_embedding"],
+        ["int4", "text", "embedding", "embedding"],
+        (
+            (user_id, f"User Query : question {i}\nAssistant Response : answer {i} " + "lorem ipsum " * 20 + "\n",
+             query, response)
+            for i, (query, response) in enumerate(embeddings)
+        ),
+    )
+
+
+def user_turns(user_id: int):
+    """turn_ids and (turns, 2, dim) query/response embeddings of the user's turns."""
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(ConversationTurn.turn_id, ConversationTurn.query_embedding, ConversationTurn.response_embedding)
+            .where(ConversationTurn.user_id == user_id)
+        ).all()
+    finally:
+        db.close()
+    embeddings = np.stack([[as_embedding(row.query_embedding), as_embedding(row.response_embedding)] for row in rows])
+    return np.array([row.turn_id for row in rows]), embeddings
+
+
+def bench_context(results: Results, population: int, turns: int, turn_users: int, queries: int, top_k: int, rng):
+    from routes.conversation import context_extraction, similar_conversations
+
+    user_ids = [user_id for user_id, _, _, _ in sample_users(turn_users, rng)]
+    for user_id in user_ids:
+        seed_turns(user_id, turns, rng)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"ANALYZE {ConversationTurn.__tablename__}"))
+
+    user_id = user_ids[0]
+    turn_ids, embeddings = user_turns(user_id)
+    # Probes near the user's own turns, so an exact scan always finds similar turns
+    probes = embeddings[rng.integers(len(turn_ids), size=queries), 0]
+    probes = probes + rng.normal(0, 0.02, size=probes.shape).astype(np.float32)
+    probes /= np.linalg.norm(probes, axis=-1, keepdims=True)
+    db = SessionLocal()
+    samples, recalls = [], []
+    try:
+        for probe in probes:
+            start = time.perf_counter()
+            context_extraction(db, user_id, "benchmark question", probe)
+            samples.append(time.perf_counter() - start)
+            found = {row.turn_id for row in similar_conversations(db, user_id, probe, top_k, similarity_floor=-1.0, recency_weight=0.0)}
+            db.rollback()
+            exact = turn_ids[np.argsort(-(embeddings @ probe).max(axis=1))[:top_k]]
+            recalls.append(len(found & set(exact.tolist())) / len(exact))
+    finally:
+        db.close()
+    results.add(f"context_extraction.sql_{population}", summarize(samples), turns=turns, turn_users=turn_users,
+                recall=round(float(np.mean(recalls)), 4))
+
+
+def table_bytes_per_row(table: str) -> float:
+    """Heap, TOAST and index bytes per row of a table, to compare vector and halfvec storage."""
+    with engine.connect() as connection:
+        size, rows = connection.execute(text(
+            f"SELECT pg_total_relation_size('{table}'), (SELECT count(*) FROM {table})"
+        )).one()
+    return round(size / rows, 1) if rows else 0.0
+
+
+def cleanup():
+    with engine.begin() as connection:
+        deleted = connection.execute(text("DELETE FROM users WHERE contact = :contact"), {"contact": BENCH_CONTACT}).rowcount
+    print(f"removed {deleted} synthetic users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 100000, 1000000], help="population sizes")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=1000, help="conversation turns of each user holding turns")
+    parser.add_argument("--turn-users", type=int, default=100, help="users given --turns turns for every population")
+    parser.add_argument("--top-k", type=int, default=5, help="similar turns whose recall is measured")
+    parser.add_argument("--voice-version", type=int, default=1, choices=sorted(VOICE_EMBEDDING_DIMS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cleanup", action="store_true", help="delete the synthetic users at the end")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    create_schema()
+    rng = np.random.default_rng(args.seed)
+    results = Results("search", {key: value for key, value in vars(args).items() if key not in ("output", "cleanup")})
+    try:
+        for population in sorted(args.users):
+            print(f"population {population}")
+            seeding = seed_users(population, args.voice_version, rng)
+            print(f"  seeding took {seeding:.1f}s")
+            bench_identification(results, population, args.queries, rng)
+            bench_context(results, population, args.turns, args.turn_users, args.queries, args.top_k, rng)
+            print(f"  users: {table_bytes_per_row('users')} bytes/row, "
+                  f"conversation turns: {table_bytes_per_row(ConversationTurn.__tablename__)} bytes/row")
+        results.write(args.output)
+    finally:
+        if args.cleanup:
+            cleanup()
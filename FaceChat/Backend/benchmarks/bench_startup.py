@@ -0,0 +1,103 @@
+"""Measures cold start of a worker: importing app.py and running its lifespan startup.
+
+Every round runs in a fresh Python process so nothing is cached in sys.modules:
+
+import      time to `import app` (routes, middleware, module-level singletons)
+startup     time from the start of the lifespan to the worker being ready, with
+            STARTUP_MODE=blocking; the time of every startup step is recorded too
+total       process start to ready, including interpreter start
+
+The startup rounds load every model and, unless SCHEMA_AUTO_CREATE=0, need the database
+configured by DATABASE_URL. --import-only skips them. --profile prints the modules with
+the largest cumulative import time (python -X importtime) from one extra process.
+
+    python benchmarks/bench_startup.py --rounds 5 --output results/startup.json
+    SCHEMA_AUTO_CREATE=0 python benchmarks/bench_startup.py --import-only --profile 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.results import Results, summarize
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process and prints one JSON line of timings
+CHILD = """
+import asyncio, json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+timings = {"import": imported - start}
+if STARTUP:
+    from pkg.lifecycle.startup import startup_state
+    async def main():
+        async with app.app.router.lifespan_context(app.app):
+            timings["startup"] = time.perf_counter() - imported
+            timings["steps"] = {name: step.get("seconds") for name, step in startup_state.steps.items()}
+    asyncio.run(main())
+print("BENCH_STARTUP " + json.dumps(timings))
+"""
+
+
+def run_child(startup: bool) -> dict:
+    env = {**os.environ, "STARTUP_MODE": "blocking"}
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", f"STARTUP = {startup}\n{CHILD}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True,
+    )
+    total = time.perf_counter() - start
+    if completed.returncode != 0:
+        raise RuntimeError(f"worker process failed:\n{completed.stderr[-4000:]}")
+    line = next(line for line in completed.stdout.splitlines() if line.startswith("BENCH_STARTUP "))
+    timings = json.loads(line[len("BENCH_STARTUP "):])
+    timings["total"] = total
+    return timings
+
+
+def import_profile(top: int):
+    """Prints the modules with the largest cumulative import time of `import app`."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    rows = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    print(f"{'module':<60} {'cumulative':>12}")
+    for cumulative, name in sorted(rows, reverse=True)[:top]:
+        print(f"{name:<60} {cumulative / 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--import-only", action="store_true", help="do not run the lifespan startup")
+    parser.add_argument("--profile", type=int, default=0, metavar="N", help="print the N slowest imports")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+
+    rounds = [run_child(startup=not args.import_only) for _ in range(args.rounds)]
+    results = Results("startup", {key: value for key, value in vars(args).items() if key in ("rounds", "import_only")})
+    results.add("startup.import", summarize([timings["import"] for timings in rounds]))
+    if not args.import_only:
+        results.add("startup.startup", summarize([timings["startup"] for timings in rounds]))
+        for step in rounds[0]["steps"]:
+            samples = [timings["steps"][step] for timings in rounds if timings["steps"].get(step) is not None]
+            if samples:
+                results.add(f"startup.step_{step}", summarize(samples))
+    results.add("startup.total", summarize([timings["total"] for timings in rounds]))
+    results.write(args.output)
+
+    if args.profile:
+        import_profile(args.profile)
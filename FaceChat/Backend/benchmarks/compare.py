@@ -0,0 +1,59 @@
+"""Compares two benchmark result files and flags regressions.
+
+A case regresses when its p95 latency grew, or its throughput dropped, by more than
+--threshold (relative). Exits with status 1 if any case regressed, so it can gate CI.
+
+    python benchmarks/compare.py results/baseline/models.json results/models.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as result_file:
+        return json.load(result_file)
+
+
+def relative_change(old: float, new: float) -> float:
+    return (new - old) / old if old else 0.0
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    regressions = []
+    print(f"{'case':<44} {'p95 before':>11} {'p95 after':>11} {'change':>8} {'thru change':>12}")
+    for name, old in baseline["cases"].items():
+        new = current["cases"].get(name)
+        if new is None:
+            print(f"{name:<44} missing from the current results")
+            continue
+        latency_change = relative_change(old["p95_ms"], new["p95_ms"])
+        throughput_change = relative_change(old["throughput_per_s"], new["throughput_per_s"])
+        regressed = latency_change > threshold or throughput_change < -threshold
+        marker = "  REGRESSION" if regressed else ""
+        print(
+            f"{name:<44} {old['p95_ms']:10.2f}ms {new['p95_ms']:10.2f}ms "
+            f"{latency_change:+8.1%} {throughput_change:+12.1%}{marker}"
+        )
+        if regressed:
+            regressions.append(name)
+    for name in current["cases"].keys() - baseline["cases"].keys():
+        print(f"{name:<44} new case")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    print(f"baseline {baseline['git_commit']} ({baseline['timestamp']}) vs current {current['git_commit']} ({current['timestamp']})")
+    if baseline.get("settings") != current.get("settings"):
+        print(f"settings differ: {baseline.get('settings')} vs {current.get('settings')}")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,126 @@
+"""Concurrent HTTP load generator for the verify, register and conversation endpoints.
+
+Each virtual user has its own cookie jar and loops over its scenario until the
+duration elapses:
+
+verify        POST /auth/api/verify with --face and --voice
+conversation  verifies once (the face and voice must belong to an enrolled user),
+              then POSTs --utterance to /conversation/api/conversation
+register      verifies with an unknown face and voice, then POSTs --utterance to
+              /auth/api/register
+
+Run the server with LLM_BACKEND=stub so no Gemini/Vertex call is made and the LLM
+latency is the fixed LLM_STUB_LATENCY_MS:
+
+    LLM_BACKEND=stub LLM_STUB_LATENCY_MS=300 uvicorn app:app --port 8000
+    python benchmarks/load_test.py --url http://localhost:8000 --scenario conversation \\
+        --face me.jpg --voice me.webm --utterance question.webm --concurrency 16 --duration 60 \\
+        --output results/load_conversation.json
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from benchmarks.results import Results, summarize
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.samples = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        with open(args.face, "rb") as face_file:
+            self.face = face_file.read()
+        with open(args.voice, "rb") as voice_file:
+            self.voice = voice_file.read()
+        self.utterance = None
+        if args.utterance:
+            with open(args.utterance, "rb") as utterance_file:
+                self.utterance = utterance_file.read()
+
+    async def request(self, client: httpx.AsyncClient, name: str, path: str, files: dict):
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, files=files)
+            status = str(response.status_code)
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        elapsed = time.perf_counter() - start
+        self.statuses[name][status] += 1
+        if response is not None and response.status_code == 200:
+            self.samples[name].append(elapsed)
+        return response
+
+    async def verify(self, client):
+        return await self.request(client, "verify", "/auth/api/verify", {
+            "face_image": ("face.jpg", self.face, "image/jpeg"),
+            "voice_audio": ("voice.webm", self.voice, "audio/webm"),
+        })
+
+    async def virtual_user(self, deadline: float):
+        async with httpx.AsyncClient(base_url=self.args.url, timeout=self.args.timeout) as client:
+            scenario = self.args.scenario
+            if scenario in ("conversation", "register"):
+                response = await self.verify(client)
+                expected = "verified" if scenario == "conversation" else "error"
+                if response is None or response.status_code != 200 or response.json().get("status") != expected:
+                    print(f"virtual user could not start the {scenario} scenario: verify did not return '{expected}'")
+                    return
+            while time.perf_counter() < deadline:
+                if scenario == "verify":
+                    await self.verify(client)
+                elif scenario == "conversation":
+                    await self.request(client, "conversation", "/conversation/api/conversation", {
+                        "audio_file": ("utterance.webm", self.utterance, "audio/webm"),
+                    })
+                else:
+                    await self.request(client, "register", "/auth/api/register", {
+                        "voice_file": ("utterance.webm", self.utterance, "audio/webm"),
+                    })
+
+    async def run(self):
+        start = time.perf_counter()
+        deadline = start + self.args.duration
+        await asyncio.gather(*[self.virtual_user(deadline) for _ in range(self.args.concurrency)])
+        return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--scenario", choices=["verify", "conversation", "register"], default="verify")
+    parser.add_argument("--face", required=True, help="face image sent to verify")
+    parser.add_argument("--voice", required=True, help="voice clip sent to verify")
+    parser.add_argument("--utterance", help="audio clip sent to conversation / register")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="JSON file for the results")
+    args = parser.parse_args()
+    if args.scenario != "verify" and not args.utterance:
+        parser.error(f"--utterance is required for the {args.scenario} scenario")
+
+    load_test = LoadTest(args)
+    elapsed = asyncio.run(load_test.run())
+
+    results = Results(f"load_{args.scenario}", {
+        key: value for key, value in vars(args).items() if key in ("url", "scenario", "concurrency", "duration")
+    })
+    for name in sorted(load_test.statuses):
+        statuses = load_test.statuses[name]
+        samples = load_test.samples[name]
+        if not samples:
+            print(f"{name}: no successful requests {dict(statuses)}")
+            continue
+        summary = summarize(samples)
+        # Throughput over wall-clock time with all virtual users running concurrently
+        summary["throughput_per_s"] = len(samples) / elapsed
+        total = sum(statuses.values())
+        results.add(name, summary, error_rate=round(1 - statuses["200"] / total, 4), statuses=dict(statuses))
+    results.write(args.output)
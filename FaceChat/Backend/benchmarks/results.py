@@ -0,0 +1,102 @@
+"""Shared helpers of the benchmark scripts: timing summaries and JSON result files.
+
+Every script can write its results with --output results/<name>.json. A result file
+holds the run metadata (time, git commit, host, relevant settings) and one entry per
+measured case; compare.py diffs two files for regressions.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Settings recorded with every result, since they change what is being measured
+RECORDED_SETTINGS = (
+    "INFERENCE_EXECUTOR", "INFERENCE_WORKERS", "MICRO_BATCHING", "MICRO_BATCH_MAX_SIZE",
+    "FACE_DETECTOR", "FACE_DETECTION_MAX_DIMENSION", "VOICE_EMBEDDING_VERSION", "WHISPER_MODEL",
+    "SENTENCE_MODEL", "VECTOR_INDEX_TYPE", "HNSW_EF_SEARCH", "IDENTIFICATION_INDEX",
+    "ASYNC_DATABASE", "LLM_BACKEND", "LLM_STUB_LATENCY_MS", "LLM_CACHE", "SCHEMA_AUTO_CREATE", "EMBEDDING_STORAGE",
+    "VERIFY_MODE", "CASCADE_FACE_TOP_K", "CASCADE_FACE_ACCEPT_DISTANCE", "CASCADE_FACE_MARGIN", "CASCADE_FACE_REJECT_DISTANCE",
+    "CASCADE_VOICE_MAX_DISTANCE",
+    "SENTENCE_BACKEND", "WHISPER_BACKEND", "SENTENCE_THREADS", "WHISPER_THREADS", "TORCH_NUM_THREADS",
+)
+
+
+def summarize(samples, items: int = 1) -> dict:
+    """Latency percentiles in ms and throughput of a list of per-call durations in seconds."""
+    seconds = np.asarray(samples, dtype=np.float64)
+    ms = seconds * 1000
+    total = float(seconds.sum())
+    return {
+        "count": int(len(seconds)),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "throughput_per_s": len(seconds) * items / total if total else 0.0,
+    }
+
+
+def time_calls(fn, args_list, warmup: int = 1) -> list:
+    """Calls fn(*args) for every args tuple and returns the durations, after `warmup` untimed calls."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def format_summary(name: str, summary: dict) -> str:
+    return (
+        f"{name:<44} p50={summary['p50_ms']:9.2f}ms p95={summary['p95_ms']:9.2f}ms "
+        f"p99={summary['p99_ms']:9.2f}ms {summary['throughput_per_s']:10.1f}/s"
+    )
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class Results:
+    """Collects named result entries of one benchmark run."""
+
+    def __init__(self, benchmark: str, parameters: dict = None):
+        self.benchmark = benchmark
+        self.parameters = parameters or {}
+        self.cases = {}
+
+    def add(self, name: str, summary: dict, **extra):
+        self.cases[name] = {**summary, **extra}
+        print(format_summary(name, summary) + "".join(f" {key}={value}" for key, value in extra.items()))
+
+    def to_dict(self) -> dict:
+        return {
+            "benchmark": self.benchmark,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+            "settings": {key: os.environ[key] for key in RECORDED_SETTINGS if key in os.environ},
+            "parameters": self.parameters,
+            "cases": self.cases,
+        }
+
+    def write(self, path: str):
+        if not path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as output:
+            json.dump(self.to_dict(), output, indent=2)
+        print(f"results written to {path}")
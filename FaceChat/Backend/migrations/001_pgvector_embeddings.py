@@ -0,0 +1,66 @@
+"""Converts users.face_image / users.voice_sample from float8[] to pgvector columns.
+
+Existing rows are backfilled in place with a cast, then the ANN indexes are
+built concurrently so the table stays readable. Safe to re-run.
+
+    python migrations/001_pgvector_embeddings.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine, vector_index_kwargs, EMBEDDING_STORAGE
+from models.user import FACE_EMBEDDING_DIM, VOICE_EMBEDDING_DIM
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COLUMNS = {
+    'face_image': FACE_EMBEDDING_DIM,
+    'voice_sample': VOICE_EMBEDDING_DIM,
+}
+
+
+def column_type(connection, column_name: str) -> str:
+    return connection.execute(
+        text("SELECT udt_name FROM information_schema.columns WHERE table_name = 'users' AND column_name = :column"),
+        {"column": column_name},
+    ).scalar()
+
+
+def index_statement(column_name: str) -> str:
+    options = vector_index_kwargs(column_name)
+    with_clause = ", ".join(f"{key} = {value}" for key, value in options["postgresql_with"].items())
+    return (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_{column_name}_ann ON users "
+        f"USING {options['postgresql_using']} ({column_name} {options['postgresql_ops'][column_name]}) WITH ({with_clause})"
+    )
+
+
+def migrate():
+    with engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        for column_name, dim in COLUMNS.items():
+            if column_type(connection, column_name) in ('vector', 'halfvec'):
+                logger.info(f"users.{column_name} is already a vector column")
+                continue
+            target = f"{EMBEDDING_STORAGE}({dim})"
+            logger.info(f"Backfilling users.{column_name} as {target}")
+            connection.execute(text(
+                f"ALTER TABLE users ALTER COLUMN {column_name} TYPE {target} USING {column_name}::{target}"
+            ))
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for column_name in COLUMNS:
+            logger.info(f"Building ANN index on users.{column_name}")
+            connection.execute(text(index_statement(column_name)))
+        connection.execute(text("ANALYZE users"))
+    logger.info("Migration completed")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,94 @@
+"""Moves users.conversations / users.conv_embedding into the conversation_turns table.
+
+Each stored conversation becomes one turn. users.conv_embedding holds two rows per
+conversation (query, response); conversations whose embeddings were cut off by the
+old 1000-row cap are re-encoded. The old columns are dropped unless --keep-columns
+is given. Safe to re-run: users that already have turns are skipped.
+
+    python migrations/002_conversation_turns.py
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+from models.conversation import ConversationTurn
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONVERSATION_PATTERN = re.compile(r'User Query : (.*)\nAssistant Response : (.*)\n$', re.DOTALL)
+
+
+def has_legacy_columns(connection) -> bool:
+    return connection.execute(text(
+        "SELECT count(*) FROM information_schema.columns "
+        "WHERE table_name = 'users' AND column_name IN ('conversations', 'conv_embedding')"
+    )).scalar() == 2
+
+
+def encode_missing(conversations):
+    if not conversations:
+        # Every conversation already has its embeddings; the encoder is not loaded
+        return []
+    from pkg.inference.model_registry import model_registry
+    sentences = []
+    for conversation in conversations:
+        match = CONVERSATION_PATTERN.match(conversation)
+        sentences.extend(match.groups() if match else (conversation, conversation))
+    return model_registry.sentence_encoder.encode(sentences, normalize_embeddings=True).tolist()
+
+
+def migrate(keep_columns: bool):
+    ConversationTurn.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        if not has_legacy_columns(connection):
+            logger.info("users has no legacy conversation columns, nothing to migrate")
+            return
+
+        rows = connection.execute(text(
+            "SELECT user_id, conversations, conv_embedding FROM users "
+            "WHERE conversations IS NOT NULL AND NOT EXISTS "
+            "(SELECT 1 FROM conversation_turns t WHERE t.user_id = users.user_id) ORDER BY user_id"
+        ))
+        migrated_users = 0
+        for user_id, conversations, conv_embedding in rows:
+            conv_embedding = conv_embedding or []
+            embedded = min(len(conversations), len(conv_embedding) // 2)
+            embeddings = conv_embedding[:embedded * 2] + encode_missing(conversations[embedded:])
+            count = len(conversations)
+            connection.execute(
+                ConversationTurn.__table__.insert(),
+                [
+                    {
+                        "user_id": user_id,
+                        "conversation": conversation,
+                        "query_embedding": embeddings[2 * i],
+                        "response_embedding": embeddings[2 * i + 1],
+                    }
+                    for i, conversation in enumerate(conversations)
+                ],
+            )
+            # Keep the original order: older conversations get older timestamps
+            connection.execute(text(
+                "UPDATE conversation_turns SET created_at = now() - (:count - rn) * interval '1 millisecond' "
+                "FROM (SELECT turn_id, row_number() OVER (ORDER BY turn_id) AS rn FROM conversation_turns "
+                "WHERE user_id = :user_id) ordered WHERE conversation_turns.turn_id = ordered.turn_id"
+            ), {"count": count, "user_id": user_id})
+            migrated_users += 1
+        logger.info(f"Migrated conversations of {migrated_users} users")
+
+        if not keep_columns:
+            connection.execute(text("ALTER TABLE users DROP COLUMN conversations, DROP COLUMN conv_embedding"))
+            logger.info("Dropped users.conversations and users.conv_embedding")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keep-columns", action="store_true", help="leave the legacy users columns in place")
+    migrate(parser.parse_args().keep_columns)
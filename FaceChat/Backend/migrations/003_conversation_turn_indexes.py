@@ -0,0 +1,42 @@
+"""Builds the ANN indexes used by context retrieval on conversation_turns.
+
+Tables created by models/conversation.py after this change already have them;
+this covers databases created earlier. Safe to re-run.
+
+    python migrations/003_conversation_turn_indexes.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine, vector_index_kwargs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEXES = {
+    'ix_conversation_turns_query_ann': 'query_embedding',
+    'ix_conversation_turns_response_ann': 'response_embedding',
+}
+
+
+def migrate():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index_name, column_name in INDEXES.items():
+            options = vector_index_kwargs(column_name)
+            with_clause = ", ".join(f"{key} = {value}" for key, value in options["postgresql_with"].items())
+            logger.info(f"Building ANN index on conversation_turns.{column_name}")
+            connection.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON conversation_turns "
+                f"USING {options['postgresql_using']} ({column_name} {options['postgresql_ops'][column_name]}) WITH ({with_clause})"
+            ))
+        connection.execute(text("ANALYZE conversation_turns"))
+    logger.info("Migration completed")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,62 @@
+"""Lets voice embeddings of different versions coexist in users.voice_sample.
+
+Adds users.voice_version (existing rows are version 1, the 13 mean MFCCs), relaxes
+voice_sample from the vector(13) of migration 001 to a dimensionless vector (or
+halfvec, per EMBEDDING_STORAGE) and replaces its ANN index with one partial
+expression index per version. Re-embed users into a new version with
+scripts/enroll.py reembed. Safe to re-run.
+
+    python migrations/004_versioned_voice_embeddings.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine, vector_index_kwargs, EMBEDDING_STORAGE
+from models.user import VOICE_EMBEDDING_DIMS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def voice_sample_type(connection) -> str:
+    """e.g. vector(13) before this migration, vector or halfvec (no dimension) after it."""
+    return connection.execute(text(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = 'users'::regclass AND attname = 'voice_sample'"
+    )).scalar()
+
+
+def migrate():
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE users ADD COLUMN IF NOT EXISTS voice_version integer NOT NULL DEFAULT 1"))
+        connection.execute(text("DROP INDEX IF EXISTS ix_users_voice_sample_ann"))
+        # Left alone once dimensionless, so a re-run does not undo a later halfvec conversion
+        if voice_sample_type(connection) in ('vector', 'halfvec'):
+            logger.info("users.voice_sample is already versioned")
+        else:
+            connection.execute(text(f"ALTER TABLE users ALTER COLUMN voice_sample TYPE {EMBEDDING_STORAGE}"))
+            logger.info("users.voice_sample is now versioned")
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for version, dim in VOICE_EMBEDDING_DIMS.items():
+            expression = f'voice_sample_v{version}'
+            options = vector_index_kwargs(expression)
+            with_clause = ", ".join(f"{key} = {value}" for key, value in options["postgresql_with"].items())
+            logger.info(f"Building ANN index for voice embedding version {version}")
+            connection.execute(text(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_voice_sample_v{version}_ann ON users "
+                f"USING {options['postgresql_using']} ((voice_sample::{EMBEDDING_STORAGE}({dim})) "
+                f"{options['postgresql_ops'][expression]}) "
+                f"WITH ({with_clause}) WHERE voice_version = {version}"
+            ))
+        connection.execute(text("ANALYZE users"))
+    logger.info("Migration completed")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,70 @@
+"""Converts the embedding columns to the EMBEDDING_STORAGE type (vector or halfvec).
+
+halfvec (pgvector >= 0.7) stores 2 bytes per dimension instead of 4, halving the
+size of users and conversation_turns and of their ANN indexes. The ANN indexes are
+dropped, every embedding column is cast in place and the indexes are rebuilt with
+the operator class of the new type. The tables are locked and rewritten while this
+runs. Safe to re-run; columns already of the target type are left alone.
+
+    EMBEDDING_STORAGE=halfvec python migrations/005_embedding_storage.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine, EMBEDDING_STORAGE
+from models.user import User, FACE_EMBEDDING_DIM
+from models.conversation import ConversationTurn, SENTENCE_EMBEDDING_DIM
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# (table, column, dimension); voice_sample holds several dimensions, see migration 004
+EMBEDDING_COLUMNS = [
+    ("users", "face_image", FACE_EMBEDDING_DIM),
+    ("users", "voice_sample", None),
+    ("conversation_turns", "query_embedding", SENTENCE_EMBEDDING_DIM),
+    ("conversation_turns", "response_embedding", SENTENCE_EMBEDDING_DIM),
+]
+
+
+def column_type(connection, table: str, column: str) -> str:
+    return connection.execute(text(
+        "SELECT udt_name FROM information_schema.columns WHERE table_name = :table AND column_name = :column"
+    ), {"table": table, "column": column}).scalar()
+
+
+def migrate():
+    ann_indexes = [
+        index for model in (User, ConversationTurn) for index in model.__table__.indexes if index.name.endswith("_ann")
+    ]
+    with engine.begin() as connection:
+        pending = [
+            (table, column, dim) for table, column, dim in EMBEDDING_COLUMNS
+            if column_type(connection, table, column) != EMBEDDING_STORAGE
+        ]
+        if not pending:
+            logger.info(f"Embedding columns are already {EMBEDDING_STORAGE}, nothing to migrate")
+            return
+        for index in ann_indexes:
+            connection.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        for table, column, dim in pending:
+            target = f"{EMBEDDING_STORAGE}({dim})" if dim else EMBEDDING_STORAGE
+            logger.info(f"Converting {table}.{column} to {target}")
+            connection.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {target} USING {column}::{target}"))
+        # Rebuilt from the models, so they use the cosine operator class of the new type
+        for index in ann_indexes:
+            logger.info(f"Building ANN index {index.name}")
+            index.create(bind=connection, checkfirst=True)
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE users"))
+        connection.execute(text("ANALYZE conversation_turns"))
+    logger.info("Migration completed")
+
+
+if __name__ == "__main__":
+    migrate()
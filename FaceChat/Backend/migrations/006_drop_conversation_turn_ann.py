@@ -0,0 +1,35 @@
+"""Drops the ANN indexes built on conversation_turns by migration 003.
+
+Context retrieval now scores every turn of the user through the (user_id, created_at)
+index: the global ANN indexes picked their candidates among all users' turns before
+the user filter, so they returned almost no turns of the caller once there were many
+users, and only slowed down turn inserts. Safe to re-run.
+
+    python migrations/006_drop_conversation_turn_ann.py
+"""
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEXES = ['ix_conversation_turns_query_ann', 'ix_conversation_turns_response_ann']
+
+
+def migrate():
+    # DROP INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for index_name in INDEXES:
+            logger.info(f"Dropping {index_name}")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}"))
+    logger.info("Migration completed")
+
+
+if __name__ == "__main__":
+    migrate()
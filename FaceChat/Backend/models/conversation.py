@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, Text, DateTime, ForeignKey, Index, func
+from database import Base
+from database import embedding_type
+from models.user import User
+
+# all-MiniLM-L6-v2 sentence embeddings
+SENTENCE_EMBEDDING_DIM = 384
+
+class ConversationTurn(Base):
+    """One user query and assistant response, with the sentence embedding of each side."""
+    __tablename__ = 'conversation_turns'
+    turn_id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey(User.user_id, ondelete='CASCADE'), nullable=False)
+    conversation = Column(Text, nullable=False)
+    query_embedding = Column(embedding_type(SENTENCE_EMBEDDING_DIM), nullable=False)
+    response_embedding = Column(embedding_type(SENTENCE_EMBEDDING_DIM), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    # Context retrieval scores all turns of one user, found through this index; the embeddings
+    # have no ANN index, which would rank every user's turns before filtering on the user
+    __table_args__ = (
+        Index('ix_conversation_turns_user_created', 'user_id', 'created_at'),
+    )
@@ -1,8 +1,26 @@
-from sqlalchemy import Column, Integer, String,FLOAT,ARRAY
+from sqlalchemy import Column, Integer, String,Index,cast
 from database import Base
-from sqlalchemy.ext.mutable import MutableList
-from pgvector.sqlalchemy import Vector
-from database import engine, SessionLocal
+from database import SessionLocal, embedding_type, vector_index_kwargs
+
+# imgbeddings returns a 768-d CLIP embedding
+FACE_EMBEDDING_DIM = 768
+
+# Dimension of each voice embedding version (see pkg/recognition/voice_recognition.VOICE_MODES)
+VOICE_EMBEDDING_DIMS = {1: 13, 2: 78, 3: 192}
+# Fixed dimension of voice_sample before migration 004 made it versioned
+VOICE_EMBEDDING_DIM = VOICE_EMBEDDING_DIMS[1]
+
+
+def _voice_indexes(voice_sample, voice_version) -> list:
+    return [
+        Index(
+            f'ix_users_voice_sample_v{version}_ann',
+            cast(voice_sample, embedding_type(dim)).label(f'voice_sample_v{version}'),
+            postgresql_where=voice_version == version,
+            **vector_index_kwargs(f'voice_sample_v{version}'),
+        )
+        for version, dim in VOICE_EMBEDDING_DIMS.items()
+    ]
 
 class User(Base):
     __tablename__ = 'users'
@@ -11,10 +29,20 @@ class User(Base):
     age = Column(Integer, nullable=False)
     gender = Column(String(10), nullable=False)
     contact = Column(String(100), nullable=False)
-    face_image = Column(ARRAY(FLOAT), nullable=False)
-    voice_sample = Column(ARRAY(FLOAT), nullable=False)
-    conversations =Column(MutableList.as_mutable(ARRAY(String)),nullable=True)
-    conv_embedding = Column(MutableList.as_mutable(ARRAY(FLOAT,dimensions=2)), nullable=True)
+    face_image = Column(embedding_type(FACE_EMBEDDING_DIM), nullable=False)
+    # Voice vectors of different versions coexist; each version has its own partial ANN index
+    voice_sample = Column(embedding_type(), nullable=False)
+    voice_version = Column(Integer, nullable=False, default=1, server_default='1')
+
+    __table_args__ = (
+        Index('ix_users_face_image_ann', face_image, **vector_index_kwargs('face_image')),
+        *_voice_indexes(voice_sample, voice_version),
+    )
+
+
+def voice_sample_as(version: int):
+    """User.voice_sample cast to the fixed dimension of a version, matching its partial index."""
+    return cast(User.voice_sample, embedding_type(VOICE_EMBEDDING_DIMS[version]))
 
 
 # Dependency to get the DB session
@@ -24,6 +52,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
-Base.metadata.create_all(bind=engine)
-
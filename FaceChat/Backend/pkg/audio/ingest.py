@@ -0,0 +1,112 @@
+import logging
+import subprocess
+import threading
+import numpy as np
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Whisper and the MFCC voice featurizer both work on 16 kHz mono float32 PCM
+SAMPLE_RATE = 16000
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+FFMPEG_COMMAND = [
+    "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+    "-i", "pipe:0",
+    "-f", "f32le", "-acodec", "pcm_f32le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+    "pipe:1",
+]
+
+
+def decode_to_pcm(data: bytes) -> np.ndarray:
+    """Decodes a complete audio file (webm, mp3, wav, ...) to 16 kHz mono float32 PCM in one ffmpeg pass."""
+    process = subprocess.run(FFMPEG_COMMAND, input=data, capture_output=True)
+    if process.returncode != 0:
+        raise ValueError(f"Could not decode audio: {process.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(process.stdout, dtype=np.float32)
+
+
+class StreamingDecoder:
+    """Decodes audio incrementally as chunks arrive, without buffering the encoded file.
+
+    Encoded chunks are written to ffmpeg's stdin with `feed`; a reader thread collects
+    the PCM it produces so `pcm()` can be read while the upload is still in progress.
+    """
+
+    def __init__(self):
+        self._process = subprocess.Popen(FFMPEG_COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._chunks = []
+        self._pending = b""
+        self._lock = threading.Lock()
+        self._stderr = b""
+        self._stdout_reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stdout_reader.start()
+        self._stderr_reader.start()
+
+    def _read_stdout(self):
+        while True:
+            data = self._process.stdout.read1(UPLOAD_CHUNK_SIZE)
+            if not data:
+                break
+            with self._lock:
+                data = self._pending + data
+                # Keep a partial float32 sample for the next read
+                usable = len(data) - len(data) % 4
+                self._chunks.append(np.frombuffer(data[:usable], dtype=np.float32))
+                self._pending = data[usable:]
+
+    def _read_stderr(self):
+        self._stderr = self._process.stderr.read()
+
+    def feed(self, chunk: bytes):
+        try:
+            self._process.stdin.write(chunk)
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            self.close()
+
+    def pcm(self) -> np.ndarray:
+        with self._lock:
+            if len(self._chunks) > 1:
+                self._chunks = [np.concatenate(self._chunks)]
+            return self._chunks[0] if self._chunks else np.zeros(0, dtype=np.float32)
+
+    def close(self) -> np.ndarray:
+        """Signals end of input and returns the fully decoded PCM."""
+        if not self._process.stdin.closed:
+            try:
+                self._process.stdin.close()
+            except BrokenPipeError:
+                pass
+        self._stdout_reader.join()
+        self._stderr_reader.join()
+        if self._process.wait() != 0:
+            raise ValueError(f"Could not decode audio: {self._stderr.decode(errors='replace').strip()}")
+        return self.pcm()
+
+    def abort(self):
+        self._process.kill()
+        self._process.wait()
+
+
+async def decode_upload(upload: UploadFile) -> np.ndarray:
+    """Streams an uploaded audio file through ffmpeg straight to 16 kHz mono float32 PCM."""
+    decoder = StreamingDecoder()
+    decoded = False
+    try:
+        while True:
+            chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            await run_in_threadpool(decoder.feed, chunk)
+        pcm = await run_in_threadpool(decoder.close)
+        decoded = True
+    finally:
+        # Also on cancellation (client gone, request timeout), so ffmpeg never outlives the request
+        if not decoded:
+            decoder.abort()
+    logger.info(f"Decoded {len(pcm) / SAMPLE_RATE:.2f}s of audio")
+    return pcm
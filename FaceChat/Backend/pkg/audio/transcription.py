@@ -0,0 +1,18 @@
+from fastapi import UploadFile
+from pkg.audio.ingest import decode_upload
+from pkg.inference.batching import transcribe_audio
+from pkg.inference.cache import transcription_cache, upload_digest
+from pkg.inference.model_registry import WHISPER_MODEL_NAME
+from pkg.observability.metrics import stage
+
+
+async def transcribe_upload(upload: UploadFile) -> str:
+    """Decodes and transcribes an uploaded clip, reusing the result for byte-identical re-uploads."""
+    async def compute():
+        with stage("transcription.decode"):
+            audio = await decode_upload(upload)
+        with stage("transcription.whisper"):
+            return await transcribe_audio(audio)
+
+    key = await upload_digest(upload, WHISPER_MODEL_NAME)
+    return await transcription_cache.get_or_compute(key, compute)
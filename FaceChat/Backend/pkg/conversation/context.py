@@ -0,0 +1,116 @@
+import logging
+import os
+import re
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Token budget for the conversation history placed in the prompt (last turns + similar turns)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# Share of the budget reserved for the most recent turns; unused budget goes to similar turns
+CONTEXT_RECENT_SHARE = float(os.getenv("CONTEXT_RECENT_SHARE", "0.5"))
+# The newest turns are kept verbatim, older recent turns are reduced to a short summary
+CONTEXT_VERBATIM_TURNS = int(os.getenv("CONTEXT_VERBATIM_TURNS", "2"))
+CONTEXT_SUMMARIZE = os.getenv("CONTEXT_SUMMARIZE", "1") == "1"
+CONTEXT_SUMMARY_CHARS = int(os.getenv("CONTEXT_SUMMARY_CHARS", "160"))
+# A turn is only truncated to fit if at least this many tokens of it would remain
+CONTEXT_MIN_TRUNCATED_TOKENS = int(os.getenv("CONTEXT_MIN_TRUNCATED_TOKENS", "32"))
+
+CHARS_PER_TOKEN = 4
+
+TURN_PATTERN = re.compile(r"User Query : (?P<query>.*?)\nAssistant Response : (?P<response>.*)", re.DOTALL)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (about four characters per token for English text)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 3].rsplit(" ", 1)[0]
+    return cut.rstrip() + "...\n"
+
+
+def summarize_turn(conversation: str) -> str:
+    """Extractive summary of a stored turn: the user's query and the first sentence of the response."""
+    match = TURN_PATTERN.match(conversation)
+    if not match:
+        return truncate_to_tokens(conversation, CONTEXT_SUMMARY_CHARS // CHARS_PER_TOKEN)
+    response = SENTENCE_END.split(match.group("response").strip(), 1)[0]
+    if len(response) > CONTEXT_SUMMARY_CHARS:
+        response = response[:CONTEXT_SUMMARY_CHARS].rsplit(" ", 1)[0] + "..."
+    return 'User Query : ' + match.group("query").strip() + '\n' + 'Assistant Response (summary) : ' + response + '\n'
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def format_user_details(user_details: dict) -> str:
+    if not user_details:
+        return ""
+    return ", ".join(f"{key}: {value}" for key, value in user_details.items() if value is not None)
+
+
+def assemble_context(last_turns, similar_turns, budget: int = None):
+    """Fits the history into a token budget and returns (similar_text, last_text, tokens).
+
+    last_turns are chronological rows with turn_id and conversation; similar_turns are
+    ordered by relevance. Similar turns already placed among the recent turns (same
+    turn_id or same text) are dropped. Recent turns are filled newest first, older ones as
+    summaries; similar turns are then added by relevance in the remaining budget, the
+    last one that does not fit being truncated.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+
+    recent = []
+    included = []
+    recent_budget = int(budget * CONTEXT_RECENT_SHARE)
+    used = 0
+    for age, turn in enumerate(reversed(last_turns)):
+        text = turn.conversation
+        if CONTEXT_SUMMARIZE and age >= CONTEXT_VERBATIM_TURNS:
+            text = summarize_turn(text)
+        tokens = estimate_tokens(text)
+        if used + tokens > recent_budget and CONTEXT_SUMMARIZE and age < CONTEXT_VERBATIM_TURNS:
+            text = summarize_turn(text)
+            tokens = estimate_tokens(text)
+        if used + tokens > recent_budget:
+            break
+        recent.append(text)
+        included.append(turn)
+        used += tokens
+    recent.reverse()
+
+    # Recent turns that did not fit may still come back as similar turns
+    seen_ids = {turn.turn_id for turn in included}
+    seen_texts = {_normalized(turn.conversation) for turn in included}
+    similar = []
+    duplicates = 0
+    for turn in similar_turns:
+        key = _normalized(turn.conversation)
+        if turn.turn_id in seen_ids or key in seen_texts:
+            duplicates += 1
+            continue
+        seen_ids.add(turn.turn_id)
+        seen_texts.add(key)
+        tokens = estimate_tokens(turn.conversation)
+        remaining = budget - used
+        if tokens > remaining:
+            if remaining >= CONTEXT_MIN_TRUNCATED_TOKENS:
+                text = truncate_to_tokens(turn.conversation, remaining)
+                similar.append(text)
+                used += estimate_tokens(text)
+            break
+        similar.append(turn.conversation)
+        used += tokens
+
+    logger.info(
+        f"Context: {len(recent)}/{len(last_turns)} recent turns, {len(similar)}/{len(similar_turns)} similar turns "
+        f"({duplicates} duplicates dropped), {used}/{budget} tokens"
+    )
+    return ''.join(text + '\n' for text in similar), ''.join(text + '\n' for text in recent), used
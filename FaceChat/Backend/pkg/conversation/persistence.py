@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import random
+import numpy as np
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal
+from models.conversation import ConversationTurn
+from pkg.inference.model_registry import model_registry
+from pkg.inference.executor import inference_executor
+from pkg.observability.metrics import stage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of most recent turns kept per user, and how often (in inserted turns) older ones are evicted
+CONVERSATION_RETENTION_TURNS = int(os.getenv("CONVERSATION_RETENTION_TURNS", "1000"))
+CONVERSATION_PRUNE_INTERVAL = int(os.getenv("CONVERSATION_PRUNE_INTERVAL", "20"))
+
+
+def format_conversation(user_response: str, llm_response: str) -> str:
+    #text conversation, both - user response and llm response combined
+    return 'User Query : '+ user_response +'\n'+ 'Assistant Response : '+ llm_response + '\n'
+
+
+def prune_conversation_turns(db: Session, user_id: int, retention: int = None):
+    """Deletes the user's oldest turns beyond the retention limit."""
+    retention = CONVERSATION_RETENTION_TURNS if retention is None else retention
+    stale_turns = (
+        select(ConversationTurn.turn_id)
+        .where(ConversationTurn.user_id == user_id)
+        .order_by(ConversationTurn.created_at.desc(), ConversationTurn.turn_id.desc())
+        .offset(retention)
+    )
+    deleted = db.execute(delete(ConversationTurn).where(ConversationTurn.turn_id.in_(stale_turns))).rowcount
+    if deleted:
+        logger.info(f"Evicted {deleted} old conversation turns of user {user_id}")
+
+
+def encode_turns(turns: list) -> np.ndarray:
+    """Encodes the query and response of every (user_id, user_response, llm_response) turn in one batch.
+
+    Row 2*i is the query embedding of turn i and row 2*i+1 its response embedding.
+    """
+    sentences = [sentence for _, user_response, llm_response in turns for sentence in (user_response, llm_response)]
+    return model_registry.sentence_encoder.encode(sentences, normalize_embeddings=True)
+
+
+def write_turns(turns: list, embeddings: np.ndarray):
+    """Inserts a batch of turns in one transaction and applies retention to the affected users."""
+    db = SessionLocal()
+    try:
+        rows = [
+            ConversationTurn(
+                user_id=user_id,
+                conversation=format_conversation(user_response, llm_response),
+                query_embedding=embeddings[2 * i],
+                response_embedding=embeddings[2 * i + 1],
+            )
+            for i, (user_id, user_response, llm_response) in enumerate(turns)
+        ]
+        db.add_all(rows)
+        db.flush()
+
+        # Retention is enforced every few inserts so its index scan is amortized
+        for user_id in {row.user_id for row in rows if row.turn_id % CONVERSATION_PRUNE_INTERVAL == 0}:
+            prune_conversation_turns(db, user_id)
+
+        db.commit()
+        logger.info(f"Stored {len(rows)} conversation turns in the database")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+class TurnWriter:
+    """Write-behind queue that persists conversation turns after the response is sent.
+
+    Turns are collected for up to `max_wait` seconds or `max_batch` items, encoded with
+    one sentence-encoder call and inserted in one transaction. Failed batches are retried
+    with jittered exponential backoff. The queue is bounded: when it is full `submit`
+    waits, which pushes back on the route instead of growing memory without limit.
+    """
+
+    def __init__(self, max_size: int = 1000, max_batch: int = 32, max_wait: float = 0.05,
+                 max_retries: int = 3, retry_backoff: float = 0.5):
+        self.max_size = max_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = None
+        self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, user_id: int, user_response: str, llm_response: str):
+        if self._task is None:
+            # Writer not running (e.g. scripts): persist inline
+            await self._write_batch([(user_id, user_response, llm_response)])
+            return
+        await self._queue.put((user_id, user_response, llm_response))
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write_batch(self, batch: list):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with stage("turn_writer.text_embeddings"):
+                    embeddings = await inference_executor.run(encode_turns, batch)
+                with stage("turn_writer.db_write"):
+                    await run_in_threadpool(write_turns, batch, embeddings)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Dropping {len(batch)} conversation turns after {attempt + 1} attempts: {e}")
+                    return
+                delay = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Storing conversation turns failed, retrying in {delay:.2f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def stop(self):
+        """Flushes every queued turn, then stops the writer."""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Conversation turn writer flushed and stopped")
+
+
+turn_writer = TurnWriter(
+    max_size=int(os.getenv("TURN_WRITER_QUEUE_SIZE", "1000")),
+    max_batch=int(os.getenv("TURN_WRITER_BATCH_SIZE", "32")),
+    max_wait=float(os.getenv("TURN_WRITER_MAX_WAIT", "0.05")),
+    max_retries=int(os.getenv("TURN_WRITER_MAX_RETRIES", "3")),
+)
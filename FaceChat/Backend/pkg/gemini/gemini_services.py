@@ -1,44 +1,18 @@
 import logging
-import google.generativeai as genai
 from fastapi import HTTPException
+from pkg.llm.client import create_llm_client, user_message
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def generate_gemini_response(prompt_text: str) -> str:
-    try:
-        model = genai.GenerativeModel('gemini-pro')
-        response = model.generate_content(prompt_text,safety_settings=[
-            {
-              "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-              "threshold": "BLOCK_NONE"
-            },
-            {
-              "category": "HARM_CATEGORY_HATE_SPEECH",
-              "threshold": "BLOCK_NONE"
-            },
-            {
-              "category": "HARM_CATEGORY_HARASSMENT",
-              "threshold": "BLOCK_NONE"            },
-            {
-              "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-              "threshold": "BLOCK_NONE"
-            }
-          ])
-        
-        # Log the entire response to understand its structure
-        logger.info(f"Full response from Gemini API: {response}")
+gemini_pro = create_llm_client("gemini_pro", "gemini", "gemini-pro")
 
-        # Check if the response contains text and handle accordingly
-        if hasattr(response, 'text'):
-            return response.text
-        else:
-            logger.error(f"Response does not contain 'text': {response}")
-            raise HTTPException(status_code=500, detail="Response format error: 'text' not found")
+async def generate_gemini_response(prompt_text: str) -> str:
+    try:
+        response_text = await gemini_pro.generate([user_message(prompt_text)])
+        logger.info(f"Full response from Gemini API: {response_text}")
+        return response_text
     except Exception as e:
         logger.error(f"Error generating response from Gemini: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating response from Gemini: {str(e)}")
-    
-    
-
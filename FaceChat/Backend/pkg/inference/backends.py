@@ -0,0 +1,159 @@
+import logging
+import os
+import re
+import tempfile
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# CPU inference backends of the sentence encoder and Whisper:
+# torch  fp32 PyTorch, the reference path
+# int8   PyTorch with dynamic int8 quantization of every Linear layer
+# onnx   ONNX Runtime; for Whisper only the audio encoder runs in ONNX Runtime, the
+#        decoder stays in PyTorch. Needs onnxruntime (and optimum for the sentence encoder)
+INFERENCE_BACKENDS = ("torch", "int8", "onnx")
+SENTENCE_BACKEND = os.getenv("SENTENCE_BACKEND", "torch")
+WHISPER_BACKEND = os.getenv("WHISPER_BACKEND", "torch")
+
+# Intra-op threads of each model's ONNX Runtime session (0 lets ONNX Runtime decide).
+# PyTorch has one intra-op pool per process, sized by TORCH_NUM_THREADS for every torch/int8 model
+SENTENCE_THREADS = int(os.getenv("SENTENCE_THREADS", "0"))
+WHISPER_THREADS = int(os.getenv("WHISPER_THREADS", "0"))
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+
+# Where exported ONNX models are kept, so each host exports a model once
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "facechat", "onnx"))
+
+
+def _check_backend(backend: str):
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def configure_torch_threads(threads: int = TORCH_NUM_THREADS):
+    if threads > 0:
+        import torch
+        if torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+            logger.info(f"PyTorch intra-op threads set to {threads}")
+
+
+def quantize_linear_layers(module):
+    """Replaces every nn.Linear (and subclass) of the module by a dynamically quantized int8 Linear, in place."""
+    import torch
+    for submodule in module.modules():
+        # quantize_dynamic only matches the exact nn.Linear class, e.g. not whisper.model.Linear,
+        # whose forward only differs by casting the weights to the input dtype
+        if isinstance(submodule, torch.nn.Linear) and type(submodule) is not torch.nn.Linear:
+            submodule.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def onnx_session(path: str, threads: int):
+    try:
+        import onnxruntime
+    except ImportError as e:
+        logger.error(f"The onnx inference backend needs onnxruntime: {e}")
+        raise
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads > 0:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return onnxruntime.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_sentence_encoder(model_name: str, backend: str = SENTENCE_BACKEND, threads: int = SENTENCE_THREADS):
+    from sentence_transformers import SentenceTransformer
+    _check_backend(backend)
+    if backend == "onnx":
+        try:
+            import onnxruntime
+        except ImportError as e:
+            logger.error(f"The onnx inference backend needs onnxruntime and optimum: {e}")
+            raise
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        return SentenceTransformer(
+            model_name, device="cpu", backend="onnx",
+            model_kwargs={"provider": "CPUExecutionProvider", "session_options": options},
+        )
+    configure_torch_threads()
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        quantize_linear_layers(model)
+    return model
+
+
+class OnnxWhisperEncoder:
+    """Stands in for whisper's AudioEncoder: log-mel batch in, audio features out, run by ONNX Runtime."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def __call__(self, mel):
+        import torch
+        features = self.session.run(None, {"mel": mel.float().cpu().numpy()})[0]
+        return torch.from_numpy(features).to(mel.device)
+
+
+def export_whisper_encoder(model, path: str):
+    import torch
+    mel = torch.zeros((1, model.dims.n_mels, 2 * model.dims.n_audio_ctx), dtype=torch.float32)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Export next to the target and rename, so concurrent workers never read a partial file
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                model.encoder, (mel,), tmp_path, input_names=["mel"], output_names=["audio_features"],
+                dynamic_axes={"mel": {0: "batch"}, "audio_features": {0: "batch"}}, opset_version=17,
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Exported the Whisper encoder to {path}")
+
+
+def load_whisper(model_name: str, backend: str = WHISPER_BACKEND, threads: int = WHISPER_THREADS):
+    import whisper
+    _check_backend(backend)
+    configure_torch_threads()
+    model = whisper.load_model(model_name, device="cpu")
+    if backend == "int8":
+        quantize_linear_layers(model)
+    elif backend == "onnx":
+        path = os.path.join(ONNX_CACHE_DIR, f"whisper-{model_name}-encoder.onnx")
+        if not os.path.exists(path):
+            export_whisper_encoder(model, path)
+        # Replaces the torch encoder, whose weights are freed; the decoder keeps running in PyTorch
+        del model.encoder
+        model.encoder = OnnxWhisperEncoder(onnx_session(path, threads))
+    return model
+
+
+def cosine_similarities(reference: np.ndarray, candidate: np.ndarray) -> np.ndarray:
+    """Row-wise cosine similarity of two embedding matrices."""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return (reference * candidate).sum(axis=1)
+
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance divided by the number of reference words, ignoring case and punctuation."""
+    ref, hyp = re.findall(r"[\w']+", reference.lower()), re.findall(r"[\w']+", hypothesis.lower())
+    if not ref:
+        return float(bool(hyp))
+    distances = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, distances[0] = distances[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, distances[j] = distances[j], min(
+                distances[j] + 1, distances[j - 1] + 1, previous + (ref_word != hyp_word)
+            )
+    return distances[-1] / len(ref)
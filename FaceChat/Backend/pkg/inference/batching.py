@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import os
+import time
+import numpy as np
+from pkg.inference.executor import inference_executor, overloaded_error
+from pkg.inference.model_registry import model_registry, transcribe, WHISPER_MODEL_NAME
+from pkg.recognition.face_recognition import embed_faces
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+MICRO_BATCHING_ENABLED = os.getenv("MICRO_BATCHING", "1") == "1"
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", "16"))
+MICRO_BATCH_MAX_WAIT_MS = float(os.getenv("MICRO_BATCH_MAX_WAIT_MS", "5"))
+# Items waiting for a batch; beyond this submit rejects with the executor's 503
+MICRO_BATCH_MAX_QUEUE = int(os.getenv("MICRO_BATCH_MAX_QUEUE", "64"))
+
+# Whisper decodes one 30 second window per item; longer clips go through transcribe()
+WHISPER_WINDOW_SAMPLES = 30 * 16000
+
+
+class BatchMetrics:
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.batch_sizes = {}
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    def record(self, batch_size: int, waits: list):
+        self.batches += 1
+        self.items += batch_size
+        self.batch_sizes[batch_size] = self.batch_sizes.get(batch_size, 0) + 1
+        self.queue_wait_total += sum(waits)
+        self.queue_wait_max = max(self.queue_wait_max, max(waits))
+
+    def snapshot(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "batch_sizes": dict(sorted(self.batch_sizes.items())),
+            "mean_queue_wait_ms": 1000 * self.queue_wait_total / self.items if self.items else 0.0,
+            "max_queue_wait_ms": 1000 * self.queue_wait_max,
+        }
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-item inference calls into batched forward passes.
+
+    `submit` enqueues one item and waits for its result. A worker task collects items
+    for up to `max_wait_ms` or until `max_batch_size` are queued, runs `batch_fn` on the
+    inference executor with the list of items, and resolves each caller's future with
+    the matching element of the returned list. At most `max_queue` items wait for a
+    batch; beyond that `submit` rejects the item with the same 503 as the executor.
+    """
+
+    def __init__(self, name: str, batch_fn, max_batch_size: int = 16, max_wait_ms: float = 5,
+                 executor=inference_executor, max_queue: int = 64):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.executor = executor
+        self.metrics = BatchMetrics()
+        self._queue = None
+        self._task = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, item):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            logger.warning(f"{self.name} batch queue is full ({self._queue.qsize()} waiting), rejecting request")
+            raise overloaded_error()
+        return await future
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            self.metrics.record(len(batch), [started - enqueued for _, _, enqueued in batch])
+            try:
+                results = await self.executor.run(self.batch_fn, [item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                logger.error(f"Batched {self.name} inference failed for {len(batch)} items: {e}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def encode_sentences(sentences: list) -> list:
+    return list(model_registry.sentence_encoder.encode(sentences, normalize_embeddings=True))
+
+
+def transcribe_batch(audios: list) -> list:
+    """Transcribes several clips; clips up to 30s share one batched Whisper decode."""
+    import torch
+    import whisper
+
+    model = model_registry.whisper
+    results = [None] * len(audios)
+    short = [i for i, audio in enumerate(audios) if len(audio) <= WHISPER_WINDOW_SAMPLES]
+    if len(short) > 1:
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audios[i]), n_mels=model.dims.n_mels)
+            for i in short
+        ]).to(model.device)
+        options = whisper.DecodingOptions(
+            language="en" if WHISPER_MODEL_NAME.endswith(".en") else None,
+            without_timestamps=True,
+            fp16=model.device.type == "cuda",
+        )
+        for i, decoded in zip(short, whisper.decode(model, mels, options)):
+            results[i] = {"text": decoded.text}
+    for i, audio in enumerate(audios):
+        if results[i] is None:
+            results[i] = transcribe(audio)
+    return results
+
+
+sentence_batcher = MicroBatcher("sentence_encoder", encode_sentences, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+                                max_queue=MICRO_BATCH_MAX_QUEUE)
+face_batcher = MicroBatcher("face_embedder", embed_faces, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+                            max_queue=MICRO_BATCH_MAX_QUEUE)
+whisper_batcher = MicroBatcher("whisper", transcribe_batch, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_MS,
+                               max_queue=MICRO_BATCH_MAX_QUEUE)
+
+batchers = [sentence_batcher, face_batcher, whisper_batcher]
+
+
+async def encode_sentence(sentence: str) -> np.ndarray:
+    if MICRO_BATCHING_ENABLED:
+        return await sentence_batcher.submit(sentence)
+    return (await inference_executor.run(encode_sentences, [sentence]))[0]
+
+
+async def embed_face(face: np.ndarray) -> np.ndarray:
+    if MICRO_BATCHING_ENABLED:
+        return await face_batcher.submit(face)
+    return (await inference_executor.run(embed_faces, [face]))[0]
+
+
+async def transcribe_audio(audio: np.ndarray) -> str:
+    if MICRO_BATCHING_ENABLED:
+        return (await whisper_batcher.submit(audio))["text"]
+    return (await inference_executor.run(transcribe, audio))["text"]
+
+
+def batching_metrics() -> dict:
+    return {batcher.name: batcher.metrics.snapshot() for batcher in batchers}
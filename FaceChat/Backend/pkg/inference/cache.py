@@ -0,0 +1,156 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+import numpy as np
+from fastapi import UploadFile
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+async def upload_digest(upload: UploadFile, *namespace: str) -> str:
+    """SHA-256 of an uploaded file's content (plus optional namespace strings), leaving it rewound."""
+    digest = hashlib.sha256()
+    for part in namespace:
+        digest.update(part.encode() + b"\0")
+    while True:
+        chunk = await upload.read(DIGEST_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    await upload.seek(0)
+    return digest.hexdigest()
+
+
+class LeaderCancelledError(Exception):
+    """The call a coalesced request was waiting on was cancelled; the waiter retries on its own."""
+
+
+def _size_of(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_size_of(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class ContentCache:
+    """LRU cache of inference results keyed by a content hash, bounded by memory and TTL.
+
+    Concurrent lookups of a key that is being computed wait for that computation instead
+    of starting their own, so a burst of identical retries runs inference once.
+    Only used from the event loop thread.
+    """
+
+    def __init__(self, name: str, max_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute):
+        """Returns the cached value for key, or awaits compute() once and caches its result.
+
+        When the request computing a key is cancelled (e.g. its client disconnected), the
+        requests waiting on it are not: they retry, and one of them computes the value.
+        """
+        while True:
+            value = self.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except LeaderCancelledError:
+                continue
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError(f"{self.name} computation was cancelled"))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no other request was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CONTENT_CACHE_TTL_SECONDS = float(os.getenv("CONTENT_CACHE_TTL_SECONDS", "300"))
+
+face_cache = ContentCache("face_embedding", CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_TTL_SECONDS)
+voice_cache = ContentCache("voice_features", CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_TTL_SECONDS)
+transcription_cache = ContentCache("transcription", CONTENT_CACHE_MAX_BYTES, CONTENT_CACHE_TTL_SECONDS)
+
+caches = [face_cache, voice_cache, transcription_cache]
+
+
+def cache_stats() -> dict:
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,73 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def overloaded_error() -> HTTPException:
+    """The 503 returned when inference work cannot be queued."""
+    return HTTPException(status_code=503, detail="Server is busy, please retry shortly", headers={"Retry-After": "1"})
+
+
+class InferenceExecutor:
+    """Bounded pool that runs CPU-bound inference off the event loop.
+
+    `kind` selects a thread or process pool. At most `max_workers + max_queue`
+    calls may be pending at once; beyond that `run` rejects the call with a 503
+    so a burst of requests cannot queue unbounded work behind the pool.
+    Functions submitted to a process pool must be picklable (module-level).
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: int = None, max_queue: int = 32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._pool = None
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="inference")
+            logger.info(f"Started {self.kind} inference pool with {self.max_workers} workers")
+        return self._pool
+
+    async def run(self, fn, *args, **kwargs):
+        if self._pending >= self.max_workers + self.max_queue:
+            logger.warning(f"Inference queue is full ({self._pending} pending), rejecting request")
+            raise overloaded_error()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+        finally:
+            self._pending -= 1
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+inference_executor = InferenceExecutor(
+    kind=os.getenv("INFERENCE_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("INFERENCE_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("INFERENCE_MAX_QUEUE", "32")),
+)
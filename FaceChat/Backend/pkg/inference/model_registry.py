@@ -0,0 +1,120 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from pkg.observability.metrics import MODEL_LOAD_SECONDS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "tiny.en")
+SENTENCE_MODEL_NAME = os.getenv("SENTENCE_MODEL", "all-MiniLM-L6-v2")
+SPEAKER_MODEL_NAME = os.getenv("SPEAKER_MODEL", "speechbrain/spkrec-ecapa-voxceleb")
+
+
+class ModelRegistry:
+    """Holds one copy of every ML model used by the routes, per worker process.
+
+    Models are loaded by `load()` at application startup. Accessing a model that
+    has not been loaded yet (e.g. in a worker process of a pool) loads it lazily.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._face_embedder = None
+        self._voice_featurizer = None
+        self._sentence_encoder = None
+        self._whisper = None
+        self._speaker_encoder = None
+
+    def _load_face_embedder(self):
+        from imgbeddings import imgbeddings
+        return imgbeddings()
+
+    def _load_voice_featurizer(self):
+        from pkg.recognition.voice_recognition import VoiceRecognition
+        return VoiceRecognition()
+
+    def _load_sentence_encoder(self):
+        # SENTENCE_BACKEND / WHISPER_BACKEND pick fp32 torch, int8 or ONNX Runtime (see backends.py)
+        from pkg.inference.backends import load_sentence_encoder
+        return load_sentence_encoder(SENTENCE_MODEL_NAME)
+
+    def _load_whisper(self):
+        from pkg.inference.backends import load_whisper
+        return load_whisper(WHISPER_MODEL_NAME)
+
+    def _load_speaker_encoder(self):
+        try:
+            from speechbrain.inference.speaker import EncoderClassifier
+        except ImportError:
+            from speechbrain.pretrained import EncoderClassifier
+        return EncoderClassifier.from_hparams(source=SPEAKER_MODEL_NAME, run_opts={"device": "cpu"})
+
+    def _get(self, attr: str, loader):
+        model = getattr(self, attr)
+        if model is None:
+            with self._lock:
+                model = getattr(self, attr)
+                if model is None:
+                    name = attr.lstrip('_')
+                    logger.info(f"Loading model for {name}")
+                    start = time.perf_counter()
+                    model = loader()
+                    MODEL_LOAD_SECONDS.labels(name).set(time.perf_counter() - start)
+                    setattr(self, attr, model)
+        return model
+
+    @property
+    def face_embedder(self):
+        return self._get("_face_embedder", self._load_face_embedder)
+
+    @property
+    def voice_featurizer(self):
+        return self._get("_voice_featurizer", self._load_voice_featurizer)
+
+    @property
+    def sentence_encoder(self):
+        return self._get("_sentence_encoder", self._load_sentence_encoder)
+
+    @property
+    def whisper(self):
+        return self._get("_whisper", self._load_whisper)
+
+    @property
+    def speaker_encoder(self):
+        # Only needed by the "ecapa" voice embedding mode, loaded on first use
+        return self._get("_speaker_encoder", self._load_speaker_encoder)
+
+    def warm_up(self):
+        """Runs one inference through every model so the first request does not pay for lazy init."""
+        from PIL import Image
+        try:
+            start = time.perf_counter()
+            silence = np.zeros(16000, dtype=np.float32)
+            self.face_embedder.to_embeddings(Image.new("RGB", (224, 224)))
+            self.voice_featurizer.extract_voice_features(silence, 16000)
+            self.sentence_encoder.encode(["warm up"], normalize_embeddings=True)
+            self.whisper.transcribe(silence)
+            MODEL_LOAD_SECONDS.labels("warm_up").set(time.perf_counter() - start)
+            logger.info("Model warm-up completed")
+        except Exception as e:
+            logger.error(f"Error during model warm-up {e}")
+            raise
+
+    def load(self, warm_up: bool = True):
+        self.face_embedder
+        self.voice_featurizer
+        self.sentence_encoder
+        self.whisper
+        logger.info("All models loaded into the registry")
+        if warm_up:
+            self.warm_up()
+
+
+model_registry = ModelRegistry()
+
+def transcribe(audio: np.ndarray) -> dict:
+    return model_registry.whisper.transcribe(audio)
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, SCHEMA_AUTO_CREATE, create_schema, check_database
+from pkg.inference.model_registry import model_registry
+from pkg.recognition.face_recognition import face_recognition
+from pkg.recognition.identification_index import identification_index, IDENTIFICATION_INDEX_ENABLED
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# background: the worker serves /healthz and /readyz while models load, /readyz turns 200 when done;
+#             if startup fails for good, /healthz turns 503 so the orchestrator restarts the worker
+# blocking: startup waits for every step and the worker fails to boot if one fails
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+# Delay between attempts of a failed startup step
+STARTUP_RETRY_SECONDS = float(os.getenv("STARTUP_RETRY_SECONDS", "5"))
+# Attempts of the models step in background mode; the database steps retry until the database answers
+STARTUP_MODEL_ATTEMPTS = int(os.getenv("STARTUP_MODEL_ATTEMPTS", "3"))
+# How long a database check of /readyz is reused, so probes do not each take a connection
+READINESS_DB_CHECK_SECONDS = float(os.getenv("READINESS_DB_CHECK_SECONDS", "5"))
+
+
+def load_models():
+    # Load every model once per worker and run a warm-up inference before serving traffic
+    model_registry.load(warm_up=True)
+    face_recognition.detector
+
+
+def load_identification_index():
+    db = SessionLocal()
+    try:
+        identification_index.load(db)
+    finally:
+        db.close()
+
+
+class StartupState:
+    """Progress of the startup steps of this worker, as reported by /readyz."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.steps = {}
+        self.ready = False
+        self.failed = False
+        self._database_checked_at = 0.0
+        self._database_error = None
+
+    def _set(self, name: str, status: str, **extra):
+        self.steps[name] = {"status": status, **extra}
+
+    async def run_step(self, name: str, fn, retry: bool = False, max_attempts: int = None):
+        """Runs a blocking step in the threadpool; with `retry` it is repeated until it succeeds,
+        or until max_attempts attempts failed."""
+        attempt = 0
+        while True:
+            attempt += 1
+            self._set(name, "running", attempt=attempt)
+            start = time.perf_counter()
+            try:
+                await run_in_threadpool(fn)
+            except Exception as e:
+                self._set(name, "failed", attempt=attempt, error=f"{type(e).__name__}: {e}")
+                if not retry or (max_attempts is not None and attempt >= max_attempts):
+                    logger.error(f"Startup step {name} failed: {e}")
+                    raise
+                logger.warning(f"Startup step {name} failed, retrying in {STARTUP_RETRY_SECONDS}s: {e}")
+                await asyncio.sleep(STARTUP_RETRY_SECONDS)
+                continue
+            self._set(name, "done", seconds=round(time.perf_counter() - start, 3))
+            logger.info(f"Startup step {name} done in {time.perf_counter() - start:.2f}s")
+            return
+
+    async def start(self):
+        # Models do not need the database, so they load while the database steps wait for it
+        retry = STARTUP_MODE != "blocking"
+        steps = [
+            asyncio.ensure_future(self.run_step("models", load_models, retry=retry, max_attempts=STARTUP_MODEL_ATTEMPTS)),
+            asyncio.ensure_future(self._database_steps()),
+        ]
+        try:
+            await asyncio.gather(*steps)
+        except Exception:
+            # The other steps are not left running on their own
+            for step in steps:
+                step.cancel()
+            await asyncio.gather(*steps, return_exceptions=True)
+            self.failed = True
+            if STARTUP_MODE == "blocking":
+                raise
+            logger.error("Startup failed, the worker reports unhealthy (see /readyz)")
+            return
+        self.ready = True
+        logger.info(f"Worker ready {time.monotonic() - self.started_at:.2f}s after startup began")
+
+    async def _database_steps(self):
+        retry = STARTUP_MODE != "blocking"
+        if SCHEMA_AUTO_CREATE:
+            await self.run_step("schema", create_schema, retry=retry)
+        if IDENTIFICATION_INDEX_ENABLED:
+            await self.run_step("identification_index", load_identification_index, retry=retry)
+
+    async def check_database(self):
+        """The error of the last database check, or None; checks again every READINESS_DB_CHECK_SECONDS."""
+        now = time.monotonic()
+        if now - self._database_checked_at >= READINESS_DB_CHECK_SECONDS:
+            try:
+                await run_in_threadpool(check_database)
+                self._database_error = None
+            except Exception as e:
+                logger.error(f"Readiness database check failed: {e}")
+                self._database_error = f"{type(e).__name__}: {e}"
+            self._database_checked_at = time.monotonic()
+        return self._database_error
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "failed": self.failed,
+            "mode": STARTUP_MODE,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "steps": self.steps,
+        }
+
+
+startup_state = StartupState()
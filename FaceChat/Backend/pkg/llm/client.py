@@ -0,0 +1,362 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from pkg.inference.cache import ContentCache, LeaderCancelledError
+from pkg.llm.resilience import ResilientBackend
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# "google" calls Gemini / Vertex AI; "stub" answers locally for offline load tests;
+# "http" talks to LLM_HTTP_URL, e.g. scripts/fake_llm_server.py injecting latency and errors
+LLM_BACKEND = os.getenv("LLM_BACKEND", "google")
+LLM_HTTP_URL = os.getenv("LLM_HTTP_URL", "http://127.0.0.1:8090")
+# Response cache: "off", "exact" (identical prompts) or "semantic" (also near-identical last messages)
+LLM_CACHE = os.getenv("LLM_CACHE", "off")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", "600"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+LLM_SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("LLM_SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+# Simulated latency of the stub backend
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "300"))
+LLM_STUB_CHUNKS = int(os.getenv("LLM_STUB_CHUNKS", "10"))
+
+SAFETY_SETTINGS = {
+    'HATE': 'BLOCK_NONE',
+    'HARASSMENT': 'BLOCK_NONE',
+    'SEXUAL': 'BLOCK_NONE',
+    'DANGEROUS': 'BLOCK_NONE'
+}
+
+
+# Messages use the Gemini chat format: [{"role": "user" | "model", "parts": [text, ...]}, ...]
+def user_message(text: str) -> dict:
+    return {"role": "user", "parts": [text]}
+
+def model_message(text: str) -> dict:
+    return {"role": "model", "parts": [text]}
+
+def _message_text(message: dict) -> str:
+    return "".join(message["parts"])
+
+
+class GeminiBackend:
+    """google.generativeai with one GenerativeModel per (model, system instruction)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _model(self, model_name: str, system_instruction: str):
+        key = (model_name, system_instruction)
+        with self._lock:
+            if key not in self._models:
+                import google.generativeai as genai
+                if not self._models:
+                    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                self._models[key] = genai.GenerativeModel(
+                    model_name, system_instruction=system_instruction, safety_settings=SAFETY_SETTINGS
+                )
+            return self._models[key]
+
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        # A chat session raises StopCandidateException on safety stops, like a direct send_message
+        chat = self._model(model_name, system_instruction).start_chat(history=messages[:-1])
+        response = await chat.send_message_async(messages[-1]["parts"])
+        return response.text
+
+    async def stream(self, model_name: str, system_instruction: str, messages: list):
+        chat = self._model(model_name, system_instruction).start_chat(history=messages[:-1])
+        response = await chat.send_message_async(messages[-1]["parts"], stream=True)
+        async for chunk in response:
+            yield chunk.text
+
+
+class VertexBackend:
+    """LangChain ChatVertexAI with one chat model per model name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def _model(self, model_name: str):
+        with self._lock:
+            if model_name not in self._models:
+                import vertexai
+                from langchain_google_vertexai import ChatVertexAI
+                if not self._models:
+                    #Intializing the vertexai with the cloud project
+                    vertexai.init(project=os.getenv("PROJECT_NAME"))
+                    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_PATH")
+                self._models[model_name] = ChatVertexAI(model=model_name)
+            return self._models[model_name]
+
+    @staticmethod
+    def _langchain_messages(system_instruction: str, messages: list) -> list:
+        converted = [('system', system_instruction)] if system_instruction else []
+        converted += [('ai' if m["role"] == "model" else 'human', _message_text(m)) for m in messages]
+        return converted
+
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        response = await self._model(model_name).ainvoke(self._langchain_messages(system_instruction, messages))
+        return response.content
+
+    async def stream(self, model_name: str, system_instruction: str, messages: list):
+        async for chunk in self._model(model_name).astream(self._langchain_messages(system_instruction, messages)):
+            yield chunk.content
+
+
+class StubBackend:
+    """Offline backend answering after a fixed delay, for load tests without Gemini/Vertex."""
+
+    def __init__(self, latency_ms: float = LLM_STUB_LATENCY_MS, chunks: int = LLM_STUB_CHUNKS):
+        self.latency_ms = latency_ms
+        self.chunks = chunks
+
+    def _reply(self, messages: list) -> str:
+        digest = hashlib.sha256(_message_text(messages[-1]).encode()).hexdigest()[:8]
+        return f"Stub response {digest} to a prompt of {sum(len(_message_text(m)) for m in messages)} characters."
+
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._reply(messages)
+
+    async def stream(self, model_name: str, system_instruction: str, messages: list):
+        words = self._reply(messages).split(" ")
+        step = max(1, len(words) // self.chunks)
+        for start in range(0, len(words), step):
+            await asyncio.sleep(self.latency_ms / 1000 / self.chunks)
+            yield " ".join(words[start:start + step]) + (" " if start + step < len(words) else "")
+
+
+class ServiceUnavailable(Exception):
+    """Retryable HTTP status (429 or 5xx) from the HTTP backend."""
+
+
+class HttpBackend:
+    """Backend posting prompts as JSON to an HTTP service answering {"text": ...} or streaming text."""
+
+    def __init__(self, url: str = LLM_HTTP_URL):
+        self.url = url
+        self._client = None
+
+    def _http(self):
+        if self._client is None:
+            import httpx
+            # Deadlines are enforced by the resilience layer
+            self._client = httpx.AsyncClient(timeout=None)
+        return self._client
+
+    @staticmethod
+    def _check(response):
+        if response.status_code == 429 or response.status_code >= 500:
+            raise ServiceUnavailable(f"HTTP {response.status_code}")
+        response.raise_for_status()
+
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        payload = {"model": model_name, "system_instruction": system_instruction, "messages": messages}
+        response = await self._http().post(f"{self.url}/generate", json=payload)
+        self._check(response)
+        return response.json()["text"]
+
+    async def stream(self, model_name: str, system_instruction: str, messages: list):
+        payload = {"model": model_name, "system_instruction": system_instruction, "messages": messages}
+        async with self._http().stream("POST", f"{self.url}/stream", json=payload) as response:
+            self._check(response)
+            async for chunk in response.aiter_text():
+                yield chunk
+
+
+class SemanticCache:
+    """Responses of earlier prompts whose query embedding is within a cosine threshold.
+
+    Only prompts with the same prefix (model, system instruction, earlier messages and
+    cache scope) are compared, so a hit differs from the original prompt in the last
+    message only.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, ttl_seconds: float):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (prefix, embedding, response, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prefix: str, embedding: np.ndarray):
+        now = time.monotonic()
+        best_key, best_similarity = None, self.threshold
+        for key, (entry_prefix, entry_embedding, _, expires_at) in list(self._entries.items()):
+            if expires_at <= now:
+                del self._entries[key]
+            elif entry_prefix == prefix:
+                similarity = float(entry_embedding @ embedding)
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+        if best_key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][2]
+
+    def set(self, key: str, prefix: str, embedding: np.ndarray, response: str):
+        self._entries[key] = (prefix, embedding, response, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+def _digest(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+class LLMClient:
+    """One configured LLM (backend, model, system instruction) with response caching.
+
+    Identical prompts that are in flight at the same time share one backend call.
+    Streams are not coalesced; a cached response is streamed back as a single chunk
+    and a completed stream fills the cache.
+
+    Callers whose last message mixes per-user data with the query pass `cache_scope`
+    (e.g. the user id and retrieved context) and `cache_query` (the raw query): the
+    semantic cache then only matches prompts of the same scope, comparing the queries.
+    """
+
+    def __init__(self, name: str, backend, model_name: str, system_instruction: str = None,
+                 cache_mode: str = LLM_CACHE):
+        self.name = name
+        self.backend = backend
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.exact_cache = None
+        self.semantic_cache = None
+        if cache_mode in ("exact", "semantic"):
+            self.exact_cache = ContentCache(f"llm_{name}", LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS)
+        if cache_mode == "semantic":
+            self.semantic_cache = SemanticCache(LLM_SEMANTIC_CACHE_THRESHOLD, LLM_SEMANTIC_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS)
+        self._inflight = {}
+        self.backend_calls = 0
+        self.coalesced = 0
+
+    def _keys(self, messages: list, cache_scope=None):
+        prefix = _digest(self.model_name, self.system_instruction, messages[:-1], cache_scope)
+        return prefix, _digest(prefix, messages[-1])
+
+    async def _embedding(self, text: str) -> np.ndarray:
+        from pkg.inference.batching import encode_sentence
+        return np.asarray(await encode_sentence(text), dtype=np.float32)
+
+    async def _cached(self, prefix: str, key: str, messages: list, cache_query: str = None):
+        """Returns (response or None, query embedding or None)."""
+        if self.exact_cache is not None:
+            response = self.exact_cache.get(key)
+            if response is not None:
+                self.exact_cache.hits += 1
+                return response, None
+            self.exact_cache.misses += 1
+        if self.semantic_cache is not None:
+            embedding = await self._embedding(cache_query if cache_query is not None else _message_text(messages[-1]))
+            return self.semantic_cache.get(prefix, embedding), embedding
+        return None, None
+
+    def _store(self, prefix: str, key: str, embedding, response: str):
+        if self.exact_cache is not None:
+            self.exact_cache.set(key, response)
+        if self.semantic_cache is not None and embedding is not None:
+            self.semantic_cache.set(key, prefix, embedding, response)
+
+    async def generate(self, messages: list, cache_scope=None, cache_query: str = None) -> str:
+        prefix, key = self._keys(messages, cache_scope)
+        response, embedding = await self._cached(prefix, key, messages, cache_query)
+        if response is not None:
+            return response
+
+        while key in self._inflight:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except LeaderCancelledError:
+                # The request making the call was cancelled; retry the call unless another request did
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            self.backend_calls += 1
+            response = await self.backend.generate(self.model_name, self.system_instruction, messages)
+            self._store(prefix, key, embedding, response)
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelledError(f"LLM call of {self.name} was cancelled"))
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no other request was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def stream(self, messages: list, cache_scope=None, cache_query: str = None):
+        prefix, key = self._keys(messages, cache_scope)
+        response, embedding = await self._cached(prefix, key, messages, cache_query)
+        if response is not None:
+            yield response
+            return
+
+        self.backend_calls += 1
+        chunks = []
+        async for chunk in self.backend.stream(self.model_name, self.system_instruction, messages):
+            chunks.append(chunk)
+            yield chunk
+        self._store(prefix, key, embedding, "".join(chunks))
+
+    def stats(self) -> dict:
+        return {
+            "backend_calls": self.backend_calls,
+            "coalesced": self.coalesced,
+            "exact_cache": self.exact_cache.stats() if self.exact_cache is not None else None,
+            "semantic_cache": self.semantic_cache.stats() if self.semantic_cache is not None else None,
+            "backend": self.backend.stats(),
+        }
+
+
+_backends = {}
+_backend_lock = threading.Lock()
+
+def get_backend(provider: str):
+    """Shared resilient backend for "gemini" or "vertex", or the one selected by LLM_BACKEND."""
+    provider = LLM_BACKEND if LLM_BACKEND in ("stub", "http") else provider
+    with _backend_lock:
+        if provider not in _backends:
+            backend_classes = {"gemini": GeminiBackend, "vertex": VertexBackend, "stub": StubBackend, "http": HttpBackend}
+            if provider not in backend_classes:
+                raise ValueError(f"Unknown LLM provider: {provider}")
+            # One circuit breaker per provider, shared by every client using it
+            _backends[provider] = ResilientBackend(backend_classes[provider](), provider)
+        return _backends[provider]
+
+
+llm_clients = []
+
+def create_llm_client(name: str, provider: str, model_name: str, system_instruction: str = None) -> LLMClient:
+    client = LLMClient(name, get_backend(provider), model_name, system_instruction)
+    llm_clients.append(client)
+    return client
+
+def llm_stats() -> dict:
+    return {client.name: client.stats() for client in llm_clients}
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Deadline of one attempt and of the whole call including retries
+LLM_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("LLM_ATTEMPT_TIMEOUT_SECONDS", "10"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "25"))
+# Streams fail if no chunk arrives for this long once the first chunk was received
+LLM_STREAM_IDLE_TIMEOUT_SECONDS = float(os.getenv("LLM_STREAM_IDLE_TIMEOUT_SECONDS", "10"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.2"))
+# A second, hedged request is sent when the first one is slower than this latency percentile (0 disables)
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# The breaker opens after this many consecutive failed calls and lets one call through after the reset time
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Reply spoken to the user when the LLM is unavailable
+LLM_FALLBACK_REPLY = os.getenv(
+    "LLM_FALLBACK_REPLY", "Sorry, I am having trouble answering right now. Please try again in a moment."
+)
+
+# Transient errors of the Google client libraries and HTTP backends, matched by name so
+# the module does not depend on any of them
+RETRYABLE_ERRORS = {
+    "ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted", "InternalServerError",
+    "TooManyRequests", "GatewayTimeout", "BadGateway", "Aborted",
+    "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+
+
+# Safety stops of google.generativeai, matched by name so the SDK is only imported when used
+SAFETY_STOP_ERRORS = {"StopCandidateException"}
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not answer in time; callers reply with LLM_FALLBACK_REPLY."""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    pass
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in RETRYABLE_ERRORS
+
+
+def is_safety_stop(error: BaseException) -> bool:
+    return type(error).__name__ in SAFETY_STOP_ERRORS
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self._opened_at >= self.reset_seconds else "open"
+
+    def acquire(self):
+        """None when the call is refused, otherwise whether it is the half-open trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.reset_seconds or self._trial_running:
+                return None
+            # Half-open: a single trial call decides whether the breaker closes again
+            self._trial_running = True
+            return True
+
+    def release_trial(self):
+        """Lets another call be the trial when the trial ended without an outcome, e.g. was cancelled."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.opened += 1
+                    logger.warning(f"LLM circuit breaker opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 512):
+        self._samples = deque(maxlen=window)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 1):
+        if len(self._samples) < min_samples:
+            return None
+        return float(np.percentile(self._samples, q))
+
+
+class ResilientBackend:
+    """Wraps an LLM backend with deadlines, jittered retries, hedging and a circuit breaker.
+
+    generate() retries transient failures within LLM_DEADLINE_SECONDS and, once enough
+    latencies are known, sends a hedged duplicate when an attempt runs past the
+    LLM_HEDGE_PERCENTILE latency; the first answer wins. stream() applies the same
+    policy until the first chunk arrives, after which chunks must keep coming within
+    the idle timeout. When the breaker is open, calls fail immediately with
+    CircuitOpenError.
+    """
+
+    def __init__(self, backend, name: str):
+        self.backend = backend
+        self.name = name
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+        self.latency = LatencyTracker()
+        self.first_chunk_latency = LatencyTracker()
+        self.attempts = 0
+        self.retries = 0
+        self.hedged = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _hedge_delay(self):
+        if LLM_HEDGE_PERCENTILE <= 0:
+            return None
+        return self.latency.percentile(LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+
+    async def _timed_attempt(self, call, timeout: float, tracker: LatencyTracker):
+        self.attempts += 1
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        tracker.add(time.monotonic() - start)
+        return result
+
+    async def _hedged_attempt(self, call, timeout: float):
+        first = asyncio.ensure_future(self._timed_attempt(call, timeout, self.latency))
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is None or hedge_delay >= timeout:
+            return await first
+        try:
+            done, _ = await asyncio.wait({first}, timeout=hedge_delay)
+        except asyncio.CancelledError:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        pending = {first, asyncio.ensure_future(self._timed_attempt(call, timeout - hedge_delay, self.latency))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, call, hedge: bool, tracker: LatencyTracker):
+        trial = self.breaker.acquire()
+        if trial is None:
+            raise CircuitOpenError(f"LLM backend {self.name} circuit is open")
+        try:
+            return await self._call_until_deadline(call, hedge, tracker)
+        finally:
+            if trial:
+                # No-op after record_success / record_failure; a cancelled trial, or one ending in a
+                # non-retryable error, counts as neither
+                self.breaker.release_trial()
+
+    async def _call_until_deadline(self, call, hedge: bool, tracker: LatencyTracker):
+        deadline = time.monotonic() + LLM_DEADLINE_SECONDS
+        attempt = 0
+        while True:
+            timeout = min(LLM_ATTEMPT_TIMEOUT_SECONDS, deadline - time.monotonic())
+            try:
+                if hedge:
+                    result = await self._hedged_attempt(call, timeout)
+                else:
+                    result = await self._timed_attempt(call, timeout, tracker)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_retryable(e):
+                    # Safety stops and bad requests say nothing about the backend's health, so they
+                    # count as neither success nor failure; a half-open trial is released by _call
+                    raise
+                # Full jitter: sleep a random time up to the exponential backoff step
+                delay = random.uniform(0, LLM_RETRY_BASE_DELAY * 2 ** attempt)
+                if attempt >= LLM_MAX_RETRIES or time.monotonic() + delay >= deadline:
+                    self.failures += 1
+                    self.breaker.record_failure()
+                    logger.error(f"LLM backend {self.name} failed after {attempt + 1} attempts: {type(e).__name__} {e}")
+                    raise LLMUnavailableError(f"LLM backend {self.name} unavailable") from e
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Retrying LLM call to {self.name} after {type(e).__name__}, attempt {attempt + 1}")
+                await asyncio.sleep(delay)
+
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        return await self._call(lambda: self.backend.generate(model_name, system_instruction, messages), hedge=True, tracker=self.latency)
+
+    async def stream(self, model_name: str, system_instruction: str, messages: list):
+        async def open_stream():
+            # Retried as a unit until the first chunk arrives
+            stream = self.backend.stream(model_name, system_instruction, messages)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except BaseException:
+                await stream.aclose()
+                raise
+            return stream, first
+
+        stream, first = await self._call(open_stream, hedge=False, tracker=self.first_chunk_latency)
+        try:
+            if first is None:
+                return
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), LLM_STREAM_IDLE_TIMEOUT_SECONDS)
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self.breaker.record_failure()
+                    raise LLMUnavailableError(f"LLM backend {self.name} stalled mid-stream")
+                yield chunk
+        finally:
+            await stream.aclose()
+
+    def stats(self) -> dict:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        first_chunk_p95 = self.first_chunk_latency.percentile(95)
+        return {
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+            "latency_p50_ms": p50 * 1000 if p50 is not None else None,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+            "first_chunk_p95_ms": first_chunk_p95 * 1000 if first_chunk_p95 is not None else None,
+        }
@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Also record every stage as an OpenTelemetry span (exported over OTLP, configured by the OTEL_* variables)
+OTEL_TRACING_ENABLED = os.getenv("OTEL_TRACING", "0") == "1"
+
+# Latency buckets from 5 ms (cache hits, SQL) to 60 s (long transcriptions, LLM retries)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_LATENCY = Histogram(
+    "facechat_stage_seconds", "Latency of one processing stage of a request", ["stage"], buckets=LATENCY_BUCKETS
+)
+STAGE_ERRORS = Counter("facechat_stage_errors_total", "Stages that raised an exception", ["stage"])
+STAGE_IN_FLIGHT = Gauge("facechat_stage_in_flight", "Stages currently running", ["stage"])
+REQUEST_LATENCY = Histogram(
+    "facechat_request_seconds", "HTTP request latency by route", ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("facechat_requests_in_flight", "HTTP requests and websocket sessions being handled", ["type"])
+VERIFICATION_DECISIONS = Counter(
+    "facechat_verification_decisions_total", "Verification outcomes by the stage that decided them", ["stage", "outcome"]
+)
+MODEL_LOAD_SECONDS = Gauge("facechat_model_load_seconds", "Time taken to load a model into this worker", ["model"])
+
+_tracer = None
+
+
+def configure_tracing():
+    """Installs an OTLP exporting tracer provider when OTEL_TRACING=1."""
+    global _tracer
+    if not OTEL_TRACING_ENABLED or _tracer is not None:
+        return
+    try:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError as e:
+        logger.error(f"OTEL_TRACING=1 but the OpenTelemetry SDK is not installed: {e}")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": os.getenv("OTEL_SERVICE_NAME", "facechat-backend")}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("facechat")
+    logger.info("OpenTelemetry tracing enabled")
+
+
+@contextmanager
+def stage(name: str):
+    """Times a block as the stage `name` (e.g. "conversation.llm"), optionally inside a span."""
+    span = _tracer.start_as_current_span(name) if _tracer is not None else None
+    if span is not None:
+        span.__enter__()
+    in_flight = STAGE_IN_FLIGHT.labels(name)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        STAGE_ERRORS.labels(name).inc()
+        if span is not None:
+            span.__exit__(type(e), e, e.__traceback__)
+            span = None
+        raise
+    finally:
+        STAGE_LATENCY.labels(name).observe(time.perf_counter() - start)
+        in_flight.dec()
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and in-flight count of HTTP requests and websocket sessions."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        method = scope.get("method", "WS")
+        status = {"code": "101" if scope["type"] == "websocket" else "500"}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = str(message["status"])
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(scope["type"])
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            matched = scope.get("route")
+            route = getattr(matched, "path", "unmatched")
+            REQUEST_LATENCY.labels(method, route, status["code"]).observe(time.perf_counter() - start)
+            in_flight.dec()
+
+
+class CallbackCollector:
+    """Gauges read at scrape time from callbacks, for queue depths owned by other modules."""
+
+    def __init__(self):
+        self._gauges = []
+
+    def add(self, name: str, documentation: str, label: str, callback):
+        """callback returns {label value: gauge value}."""
+        self._gauges.append((name, documentation, label, callback))
+
+    def collect(self):
+        for name, documentation, label, callback in self._gauges:
+            family = GaugeMetricFamily(name, documentation, labels=[label])
+            try:
+                for label_value, value in callback().items():
+                    family.add_metric([label_value], value)
+            except Exception as e:
+                logger.error(f"Error collecting {name}: {e}")
+                continue
+            yield family
+
+
+callback_collector = CallbackCollector()
+REGISTRY.register(callback_collector)
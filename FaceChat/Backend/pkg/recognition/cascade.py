@@ -0,0 +1,114 @@
+import logging
+import os
+from typing import TYPE_CHECKING
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from database import set_vector_search_params, vector_search_params, HNSW_EF_SEARCH
+from models.user import User
+from pkg.observability.metrics import VERIFICATION_DECISIONS
+from pkg.recognition.voice_recognition import VOICE_MATCH_VERSIONS
+from pkg.storage.embeddings import as_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+# parallel: face and voice are both computed and scored together (the original path)
+# cascade:  the face shortlists candidates and decides alone when it is confident; voice
+#           features are only computed for ambiguous faces and scored against the shortlist
+VERIFY_MODE = os.getenv("VERIFY_MODE", "parallel")
+if VERIFY_MODE not in ("parallel", "cascade"):
+    raise ValueError(f"Unknown verify mode: {VERIFY_MODE}")
+
+# Number of nearest faces kept for the voice stage
+CASCADE_FACE_TOP_K = int(os.getenv("CASCADE_FACE_TOP_K", "10"))
+# Cosine distances of the face stage: at most ACCEPT (and MARGIN closer than the runner-up)
+# accepts without voice, from REJECT on nobody matches
+CASCADE_FACE_ACCEPT_DISTANCE = float(os.getenv("CASCADE_FACE_ACCEPT_DISTANCE", "0.15"))
+CASCADE_FACE_MARGIN = float(os.getenv("CASCADE_FACE_MARGIN", "0.1"))
+CASCADE_FACE_REJECT_DISTANCE = float(os.getenv("CASCADE_FACE_REJECT_DISTANCE", "0.5"))
+# Largest voice cosine distance accepted in the voice stage
+CASCADE_VOICE_MAX_DISTANCE = float(os.getenv("CASCADE_VOICE_MAX_DISTANCE", "0.5"))
+
+
+def face_shortlist_query(img_embedding, top_k: int = CASCADE_FACE_TOP_K):
+    """The top_k users nearest to the face probe, through the face ANN index."""
+    face_distance = User.face_image.cosine_distance(as_embedding(img_embedding))
+    return (
+        select(
+            User.user_id,
+            User.name,
+            User.age,
+            User.gender,
+            User.contact,
+            User.voice_version,
+            User.voice_sample,
+            face_distance.label("face_distance"),
+        )
+        .order_by(face_distance)
+        .limit(top_k)
+    )
+
+
+def shortlist_candidates(rows) -> list:
+    """Rows of face_shortlist_query as (face_distance, voice_version, voice, detail), nearest first."""
+    return [
+        (row.face_distance, row.voice_version, as_embedding(row.voice_sample),
+         (row.user_id, row.name, row.age, row.gender, row.contact))
+        for row in rows
+    ]
+
+
+def face_shortlist(db: Session, img_embedding, top_k: int = CASCADE_FACE_TOP_K) -> list:
+    set_vector_search_params(db, ef_search=max(HNSW_EF_SEARCH, top_k))
+    return shortlist_candidates(db.execute(face_shortlist_query(img_embedding, top_k)).all())
+
+
+async def face_shortlist_async(db: "AsyncSession", img_embedding, top_k: int = CASCADE_FACE_TOP_K) -> list:
+    await db.execute(vector_search_params(ef_search=max(HNSW_EF_SEARCH, top_k)))
+    return shortlist_candidates((await db.execute(face_shortlist_query(img_embedding, top_k))).all())
+
+
+def decide_on_face(candidates: list):
+    """(stage, detail or None) when the face alone decides, None when the voice stage is needed."""
+    if not candidates or candidates[0][0] >= CASCADE_FACE_REJECT_DISTANCE:
+        return "face", None
+    best = candidates[0][0]
+    runner_up = candidates[1][0] if len(candidates) > 1 else CASCADE_FACE_REJECT_DISTANCE
+    if best <= CASCADE_FACE_ACCEPT_DISTANCE and runner_up - best >= CASCADE_FACE_MARGIN:
+        return "face", candidates[0][3]
+    return None
+
+
+def voice_versions_needed(candidates: list) -> list:
+    """Voice embedding versions of the shortlisted users that can still match; users enrolled under
+    a version outside VOICE_MATCH_VERSIONS never match, as in the parallel path."""
+    versions = {version for distance, version, _, _ in candidates if distance < CASCADE_FACE_REJECT_DISTANCE}
+    return sorted(versions & set(VOICE_MATCH_VERSIONS))
+
+
+def decide_on_voice(candidates: list, vce_embeddings: dict):
+    """Best face + voice match among the shortlist, scoring each user with the probe of its own version."""
+    best, best_score = None, np.inf
+    probes = {}
+    for version, embedding in vce_embeddings.items():
+        probe = as_embedding(embedding)
+        probes[version] = probe / (np.linalg.norm(probe) or 1.0)
+    for face_distance, version, voice, detail in candidates:
+        probe = probes.get(version)
+        if face_distance >= CASCADE_FACE_REJECT_DISTANCE or probe is None:
+            continue
+        voice = voice[:probe.shape[0]]
+        voice_distance = 1.0 - float(voice @ probe) / (float(np.linalg.norm(voice)) or 1.0)
+        if voice_distance < CASCADE_VOICE_MAX_DISTANCE and face_distance + voice_distance < best_score:
+            best, best_score = detail, face_distance + voice_distance
+    return "voice", best
+
+
+def record_decision(stage: str, detail):
+    outcome = "match" if detail is not None else "no_match"
+    VERIFICATION_DECISIONS.labels(stage, outcome).inc()
+    logger.info(f"Verification decided by the {stage} stage: {outcome}")
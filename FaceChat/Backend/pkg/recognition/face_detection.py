@@ -0,0 +1,99 @@
+import logging
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def downscale(image: np.ndarray, max_dimension: int):
+    """Returns the image shrunk so its longest side is at most max_dimension, and the scale applied."""
+    import cv2
+    height, width = image.shape[:2]
+    scale = max_dimension / max(height, width)
+    if scale >= 1:
+        return image, 1.0
+    small = cv2.resize(image, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+class FaceDetector(ABC):
+    """Finds faces in a BGR image and returns their (x, y, w, h) boxes in full-resolution pixels.
+
+    Detection runs on a copy downscaled to `max_dimension` on its longest side; boxes are
+    mapped back so callers can crop the original frame.
+    """
+
+    def __init__(self, max_dimension: int = 640, min_face_size: int = 100):
+        self.max_dimension = max_dimension
+        self.min_face_size = min_face_size
+
+    @abstractmethod
+    def _detect(self, small: np.ndarray, min_size: int) -> np.ndarray:
+        """(x, y, w, h) boxes of the faces in the downscaled image, none smaller than min_size."""
+
+    def detect(self, image: np.ndarray) -> list:
+        small, scale = downscale(image, self.max_dimension)
+        boxes = self._detect(small, max(1, round(self.min_face_size * scale)))
+        height, width = image.shape[:2]
+        faces = []
+        for x, y, w, h in boxes:
+            x, y = max(0, int(x / scale)), max(0, int(y / scale))
+            w, h = min(width - x, int(w / scale)), min(height - y, int(h / scale))
+            if w >= self.min_face_size and h >= self.min_face_size:
+                faces.append((x, y, w, h))
+        return faces
+
+
+class HaarFaceDetector(FaceDetector):
+    def __init__(self, scale_factor: float = 1.1, min_neighbors: int = 5, **kwargs):
+        super().__init__(**kwargs)
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        import cv2
+        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def _detect(self, small: np.ndarray, min_size: int) -> np.ndarray:
+        import cv2
+        # Gray conversion happens on the downscaled copy, not the full frame
+        gray_image = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return self.face_cascade.detectMultiScale(
+            gray_image, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors, minSize=(min_size, min_size)
+        )
+
+
+class YuNetFaceDetector(FaceDetector):
+    """OpenCV's YuNet CNN detector (cv2.FaceDetectorYN); faster and more accurate than Haar on CPU.
+
+    Needs the face_detection_yunet ONNX model from the OpenCV model zoo at `model_path`.
+    """
+
+    def __init__(self, model_path: str, score_threshold: float = 0.8, nms_threshold: float = 0.3, **kwargs):
+        super().__init__(**kwargs)
+        if not model_path or not os.path.exists(model_path):
+            raise ValueError(f"YuNet face detector model not found: {model_path}")
+        import cv2
+        self.detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold)
+
+    def _detect(self, small: np.ndarray, min_size: int) -> np.ndarray:
+        height, width = small.shape[:2]
+        self.detector.setInputSize((width, height))
+        _, detections = self.detector.detect(small)
+        if detections is None:
+            return []
+        return [tuple(box) for box in detections[:, :4] if box[2] >= min_size and box[3] >= min_size]
+
+
+def create_face_detector() -> FaceDetector:
+    backend = os.getenv("FACE_DETECTOR", "haar")
+    options = {
+        "max_dimension": int(os.getenv("FACE_DETECTION_MAX_DIMENSION", "640")),
+        "min_face_size": int(os.getenv("FACE_MIN_SIZE", "100")),
+    }
+    if backend == "yunet":
+        logger.info("Using YuNet face detector")
+        return YuNetFaceDetector(os.getenv("FACE_DETECTOR_MODEL"), **options)
+    if backend != "haar":
+        raise ValueError(f"Unknown face detector backend: {backend}")
+    return HaarFaceDetector(min_neighbors=int(os.getenv("FACE_MIN_NEIGHBORS", "5")), **options)
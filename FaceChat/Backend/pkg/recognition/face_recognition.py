@@ -1,34 +1,45 @@
-import cv2
 import numpy as np
 import logging
-from imgbeddings import imgbeddings
 import io
-from PIL import Image
+from pkg.inference.model_registry import model_registry
+from pkg.recognition.face_detection import FaceDetector, create_face_detector
 
 logging.basicConfig(level=logging.INFO,)
 logger=logging.getLogger(__name__)
 
 class FaceRecognition:
-    def __init__(self):
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+    def __init__(self, detector: FaceDetector = None):
+        # The configured detector (and OpenCV with it) is created on first use, not at import
+        self._detector = detector
+
+    @property
+    def detector(self) -> FaceDetector:
+        if self._detector is None:
+            self._detector = create_face_detector()
+        return self._detector
 
     def recognize_face(self, face_image: io.BytesIO) -> np.ndarray:
+        face = self.detect_face(face_image)
+        # Extract the face embedding
+        face_embedding = self.extract_face_embedding(face)
+        logger.info("Face embedding have been calculated successfully")
+        return face_embedding
+
+    def detect_face(self, face_image: io.BytesIO) -> np.ndarray:
+        """Returns the crop of the single face in the image, raising ValueError for zero or several faces."""
+        import cv2
         try:
-            #converted IOBytes object to bytes
-            image_bytes=face_image.read()
-        
-            #converted bytes to numpy array
-            image_array= np.frombuffer(image_bytes,np.uint8)
+            #wrapped the BytesIO buffer as a numpy array without copying it
+            image_array= np.frombuffer(face_image.getbuffer(),np.uint8)
         
             #converted numpy array in to image
             image=cv2.imdecode(image_array,cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError('Image could not be decoded')
         
-            #converted the image to grey for face detection
-            gray_image=cv2.cvtColor(image,cv2.COLOR_BGR2GRAY)
+            logger.info('Image is read, detecting faces on a downscaled copy')
         
-            logger.info('Image is read and converted to Gray-scale for face detection')
-        
-            faces = self.face_cascade.detectMultiScale(gray_image, scaleFactor=1.1, minNeighbors=2, minSize=(100, 100))
+            faces = self.detector.detect(image)
         
             if len(faces)> 1:
                 raise ValueError('More than one face have been detected')
@@ -37,13 +48,7 @@ class FaceRecognition:
         
             # Extract the single face
             (x, y, w, h) = faces[0]
-            face = image[y:y+h, x:x+w]
-        
-            # Extract the face embedding
-            face_embedding = self.extract_face_embedding(face)
-            
-            logger.info("Face embedding have been calculated successfully")
-            return face_embedding
+            return image[y:y+h, x:x+w]
         
         except ValueError as ve:
             logger.error(f"Error in Extracting the Face image {ve}")
@@ -54,13 +59,29 @@ class FaceRecognition:
             
 
     def extract_face_embedding(self, image):
+        return self.extract_face_embeddings([image])
+
+    def extract_face_embeddings(self, images: list) -> np.ndarray:
+        """Embeds several face crops in one forward pass; row i belongs to images[i]."""
+        from PIL import Image
         try:
-            face_image=Image.fromarray(image)
-            imembed=imgbeddings()
-            embedding=imembed.to_embeddings(face_image)
+            face_images=[Image.fromarray(image) for image in images]
+            embeddings=model_registry.face_embedder.to_embeddings(face_images)
             logger.info("Successfully extracted vector embeddings from the face image")
-            return embedding
+            return embeddings
         
         except Exception as e:
             logger.error(f"Error in Extracting Face Embedding {e}")
-            raise
\ No newline at end of file
+            raise
+
+face_recognition = FaceRecognition()
+
+def recognize_face(image_bytes: bytes) -> np.ndarray:
+    return face_recognition.recognize_face(io.BytesIO(image_bytes))
+
+def detect_face(image_bytes: bytes) -> np.ndarray:
+    return face_recognition.detect_face(io.BytesIO(image_bytes))
+
+def embed_faces(faces: list) -> list:
+    embeddings = face_recognition.extract_face_embeddings(faces)
+    return [embedding.reshape(1, -1) for embedding in embeddings]
@@ -0,0 +1,271 @@
+import logging
+import os
+import threading
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+from models.user import User, FACE_EMBEDDING_DIM, VOICE_EMBEDDING_DIMS
+from pkg.storage.embeddings import as_embedding
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IdentificationIndex:
+    """In-memory copy of the enrolled face and voice embeddings for exact top-1 identification.
+
+    Embeddings are kept L2-normalized in contiguous float32 matrices so the cosine
+    distance to every user is a single matrix-vector product. `refresh` pulls the users
+    enrolled after the highest user_id read from the database (users added locally do not
+    move it, so lower ids enrolled meanwhile on other workers are still picked up), and
+    every reload_interval seconds rereads all users into new arrays that replace the
+    current ones, so re-embedded users are updated and deleted users disappear.
+    Voice rows are zero-padded to the widest voice embedding version and tagged with
+    their version, so each user is compared against the probe of its own version.
+    """
+
+    def __init__(self, face_dim: int = FACE_EMBEDDING_DIM, voice_dim: int = max(VOICE_EMBEDDING_DIMS.values()),
+                 initial_capacity: int = 1024, refresh_interval: float = 5.0, reload_interval: float = 300.0):
+        self._lock = threading.Lock()
+        # Serializes loads, so concurrent refreshes never read the same users twice
+        self._refresh_lock = threading.Lock()
+        self._faces = np.empty((initial_capacity, face_dim), dtype=np.float32)
+        self._voices = np.empty((initial_capacity, voice_dim), dtype=np.float32)
+        self._voice_versions = np.empty(initial_capacity, dtype=np.int16)
+        self._user_ids = np.empty(initial_capacity, dtype=np.int64)
+        self._details = {}
+        # user_id -> row, so a user read again replaces its row
+        self._rows = {}
+        self._size = 0
+        # Highest user_id read from the database
+        self._loaded_user_id = 0
+        self._last_refresh = 0.0
+        self._last_reload = 0.0
+        # Users added locally while a reload runs, replayed into the reloaded arrays
+        self._reload_adds = None
+        self.refresh_interval = refresh_interval
+        self.reload_interval = reload_interval
+
+    def __len__(self):
+        return self._size
+
+    def _reserve(self, extra: int):
+        capacity = self._user_ids.shape[0]
+        if self._size + extra <= capacity:
+            return
+        new_capacity = max(capacity * 2, self._size + extra)
+        for name in ("_faces", "_voices", "_voice_versions", "_user_ids"):
+            old = getattr(self, name)
+            new = np.empty((new_capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def add_many(self, user_ids, faces, voices, voice_versions, details):
+        """Appends new users; users already in the index get their row replaced."""
+        faces = _normalize(np.asarray(faces, dtype=np.float32).reshape(len(user_ids), -1))
+        padded = np.zeros((len(user_ids), self._voices.shape[1]), dtype=np.float32)
+        for i, voice in enumerate(voices):
+            voice = np.asarray(voice, dtype=np.float32).reshape(-1)
+            padded[i, :voice.shape[0]] = voice
+        voices = _normalize(padded)
+        user_ids = [int(user_id) for user_id in user_ids]
+        voice_versions = np.asarray(voice_versions, dtype=np.int16)
+        with self._lock:
+            existing = [i for i, user_id in enumerate(user_ids) if user_id in self._rows]
+            new = [i for i, user_id in enumerate(user_ids) if user_id not in self._rows]
+            if existing:
+                rows = [self._rows[user_ids[i]] for i in existing]
+                self._faces[rows] = faces[existing]
+                self._voices[rows] = voices[existing]
+                self._voice_versions[rows] = voice_versions[existing]
+            if new:
+                self._reserve(len(new))
+                end = self._size + len(new)
+                self._faces[self._size:end] = faces[new]
+                self._voices[self._size:end] = voices[new]
+                self._voice_versions[self._size:end] = voice_versions[new]
+                self._user_ids[self._size:end] = [user_ids[i] for i in new]
+                for row, i in enumerate(new, self._size):
+                    self._rows[user_ids[i]] = row
+                self._size = end
+            for user_id, detail in zip(user_ids, details):
+                self._details[user_id] = detail
+
+    def add(self, user_id: int, face, voice, voice_version: int, detail: tuple):
+        if user_id in self._details:
+            return
+        args = ([user_id], [face], [voice], [voice_version], [detail])
+        with self._lock:
+            if self._reload_adds is not None:
+                self._reload_adds.append(args)
+        self.add_many(*args)
+
+    def _load_rows(self, db: Session, after_user_id: int, chunk_size: int = 10000) -> int:
+        """Reads the users after after_user_id; callers hold _refresh_lock."""
+        query = (
+            db.query(User.user_id, User.name, User.age, User.gender, User.contact, User.face_image,
+                     User.voice_sample, User.voice_version)
+            .filter(User.user_id > after_user_id)
+            .order_by(User.user_id)
+            .yield_per(chunk_size)
+        )
+        loaded = 0
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) == chunk_size:
+                loaded += self._add_rows(batch)
+                batch = []
+        if batch:
+            loaded += self._add_rows(batch)
+        self._last_refresh = time.monotonic()
+        return loaded
+
+    def _add_rows(self, rows) -> int:
+        self._loaded_user_id = max(self._loaded_user_id, rows[-1].user_id)
+        self.add_many(
+            [row.user_id for row in rows],
+            [as_embedding(row.face_image) for row in rows],
+            [as_embedding(row.voice_sample) for row in rows],
+            [row.voice_version for row in rows],
+            [(row.user_id, row.name, row.age, row.gender, row.contact) for row in rows],
+        )
+        return len(rows)
+
+    def _reload(self, db: Session) -> int:
+        """Reads every user into new arrays and swaps them in; callers hold _refresh_lock."""
+        fresh = IdentificationIndex(self._faces.shape[1], self._voices.shape[1], max(self._size, 1))
+        with self._lock:
+            self._reload_adds = []
+        try:
+            loaded = fresh._load_rows(db, after_user_id=0)
+        finally:
+            with self._lock:
+                reload_adds, self._reload_adds = self._reload_adds, None
+        with self._lock:
+            for args in reload_adds:
+                fresh.add_many(*args)
+            for name in ("_faces", "_voices", "_voice_versions", "_user_ids", "_details", "_rows", "_size"):
+                setattr(self, name, getattr(fresh, name))
+            self._loaded_user_id = fresh._loaded_user_id
+        self._last_refresh = self._last_reload = fresh._last_refresh
+        return loaded
+
+    def load(self, db: Session):
+        start = time.perf_counter()
+        with self._refresh_lock:
+            # Continues after the last loaded user, so a retried load does not read users twice
+            loaded = self._load_rows(db, after_user_id=self._loaded_user_id)
+            if self._last_reload == 0.0:
+                self._last_reload = self._last_refresh
+        logger.info(f"Identification index loaded {loaded} users in {time.perf_counter() - start:.2f}s")
+
+    def reload_due(self) -> bool:
+        return self.reload_interval > 0 and time.monotonic() - self._last_reload >= self.reload_interval
+
+    def refresh(self, db: Session) -> int:
+        """Loads users enrolled by other workers since the last load, or rereads every user when a reload is due."""
+        with self._refresh_lock:
+            if self.reload_due():
+                loaded = self._reload(db)
+                logger.info(f"Identification index reloaded {loaded} users")
+                return loaded
+            loaded = self._load_rows(db, after_user_id=self._loaded_user_id)
+        if loaded:
+            logger.info(f"Identification index refreshed with {loaded} new users")
+        return loaded
+
+    def search(self, img_embedding, vce_embeddings: dict, similarity_threshold: float = 0.5):
+        """Returns the (user_id, name, age, gender, contact) minimizing face + voice cosine distance, or None.
+
+        vce_embeddings maps voice embedding version to the probe computed in that version;
+        users enrolled under a version without a probe never match.
+        """
+        face = _normalize(np.asarray(img_embedding, dtype=np.float32).reshape(-1))
+        with self._lock:
+            size = self._size
+            faces = self._faces[:size]
+            voices = self._voices[:size]
+            voice_versions = self._voice_versions[:size]
+            user_ids = self._user_ids[:size]
+            # A reload replaces the arrays and details together
+            details = self._details
+        if size == 0:
+            return None
+
+        face_distance = 1.0 - faces @ face
+        voice_distance = np.full(size, np.inf, dtype=np.float32)
+        for version, embedding in vce_embeddings.items():
+            voice = _normalize(np.asarray(embedding, dtype=np.float32).reshape(-1))
+            rows = voice_versions == version
+            voice_distance[rows] = 1.0 - voices[rows, :voice.shape[0]] @ voice
+        combined = face_distance + voice_distance
+        combined[(face_distance >= similarity_threshold) | (voice_distance >= similarity_threshold)] = np.inf
+        best = int(np.argmin(combined))
+        if not np.isfinite(combined[best]):
+            return None
+        return details[int(user_ids[best])]
+
+    def shortlist(self, img_embedding, top_k: int) -> list:
+        """The top_k users nearest to the face probe as (face_distance, voice_version, voice, detail), nearest first.
+
+        `voice` is the user's normalized voice embedding, zero-padded to the widest version.
+        """
+        face = _normalize(np.asarray(img_embedding, dtype=np.float32).reshape(-1))
+        with self._lock:
+            size = self._size
+            faces = self._faces[:size]
+            voices = self._voices[:size]
+            voice_versions = self._voice_versions[:size]
+            user_ids = self._user_ids[:size]
+            details = self._details
+        if size == 0:
+            return []
+        face_distance = 1.0 - faces @ face
+        k = min(top_k, size)
+        nearest = np.argpartition(face_distance, k - 1)[:k]
+        nearest = nearest[np.argsort(face_distance[nearest])]
+        return [
+            (float(face_distance[i]), int(voice_versions[i]), voices[i], details[int(user_ids[i])])
+            for i in nearest
+        ]
+
+    def snapshot(self):
+        """(user_ids, faces, voices, voice_versions) of the indexed users, as copies.
+
+        Faces and voices are L2-normalized; voices are zero-padded to the widest version.
+        """
+        with self._lock:
+            size = self._size
+            return (self._user_ids[:size].copy(), self._faces[:size].copy(), self._voices[:size].copy(),
+                    self._voice_versions[:size].copy())
+
+    def refresh_due(self) -> bool:
+        return time.monotonic() - self._last_refresh >= self.refresh_interval
+
+    def find_similar_embeddings(self, db: Session, img_embedding, vce_embeddings: dict, similarity_threshold: float = 0.5):
+        """Drop-in replacement for the SQL identification query, refreshing on a miss."""
+        match = self.search(img_embedding, vce_embeddings, similarity_threshold)
+        if match is None and self.refresh_due():
+            if self.refresh(db):
+                match = self.search(img_embedding, vce_embeddings, similarity_threshold)
+        if match is None:
+            logger.info("No Matching user with the provided embeddings")
+            return 'No Match Found'
+        logger.info(f"Success,Found matching user{match[0]}")
+        return match
+
+
+IDENTIFICATION_INDEX_ENABLED = os.getenv("IDENTIFICATION_INDEX", "0") == "1"
+
+identification_index = IdentificationIndex(
+    refresh_interval=float(os.getenv("IDENTIFICATION_INDEX_REFRESH_SECONDS", "5")),
+    # Full rereads pick up embeddings updated in place (re-embedding, voice version migration); 0 disables
+    reload_interval=float(os.getenv("IDENTIFICATION_INDEX_RELOAD_SECONDS", "300")),
+)
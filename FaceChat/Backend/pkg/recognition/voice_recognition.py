@@ -1,23 +1,41 @@
-import librosa
 import numpy as np
 import logging
 import io
+import os
+from pkg.inference.model_registry import model_registry
+from models.user import VOICE_EMBEDDING_DIMS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Voice embedding versions: the version is stored next to every enrolled vector
+VOICE_MODES = {
+    1: "mfcc_mean",   # mean of 13 MFCCs
+    2: "mfcc_stats",  # mean and std of 13 MFCCs, their deltas and delta-deltas
+    3: "ecapa",       # ECAPA-TDNN speaker embedding (speechbrain)
+}
+
+# Version used for new enrollments; VOICE_MATCH_VERSIONS lists the versions a probe is
+# computed in during verification, so users enrolled under an older version still match
+VOICE_EMBEDDING_VERSION = int(os.getenv("VOICE_EMBEDDING_VERSION", "1"))
+VOICE_MATCH_VERSIONS = sorted({int(v) for v in os.getenv("VOICE_MATCH_VERSIONS", "").split(",") if v} | {VOICE_EMBEDDING_VERSION})
+
+HOP_LENGTH = 512
+
+
 class VoiceRecognition:
     def __init__(self):
         self.voice_model = None  # Initialize a voice recognition model
         logger.info("VoiceRecognition model initialized.")
 
     def recognize_voice(self, voice_sample: io.BytesIO) -> np.ndarray:
+        import librosa
         try:
             # Load the voice sample using librosa
             voice_sample.seek(0)  # Ensure we are reading from the start of the file
             y, sr = librosa.load(voice_sample, sr=16000)
-            
+
             # Extract the voice features
             voice_features = self.extract_voice_features(y, sr)
             logger.info("Voice features extracted successfully.")
@@ -26,17 +44,83 @@ class VoiceRecognition:
             logger.error(f"Error in recognizing voice: {e}")
             raise
 
-    def extract_voice_features(self, y: np.ndarray, sr: int) -> np.ndarray:
+    def extract_voice_features(self, y: np.ndarray, sr: int, version: int = None) -> np.ndarray:
+        import librosa
         try:
-            mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
-            voice_features = np.mean(mfccs.T, axis=0)
+            version = version or VOICE_EMBEDDING_VERSION
+            if version == 1:
+                # Single clips keep the exact original computation
+                mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+                voice_features = np.mean(mfccs.T, axis=0)
+            else:
+                voice_features = self.extract_voice_features_batch([y], sr, version)[0]
             logger.info(f"Extracted voice features: {voice_features}")
             return voice_features
         except Exception as e:
             logger.error(f"Error in extracting voice features: {e}")
             raise
 
-voice_recognition = VoiceRecognition()
+    def extract_voice_features_batch(self, clips: list, sr: int, version: int = None) -> np.ndarray:
+        """Featurizes many clips in one vectorized pass; row i is the embedding of clips[i]."""
+        version = version or VOICE_EMBEDDING_VERSION
+        if version not in VOICE_MODES:
+            raise ValueError(f"Unknown voice embedding version: {version}")
+        if VOICE_MODES[version] == "ecapa":
+            return self._speaker_embeddings(clips, sr)
+
+        import librosa
+        # Zero-pad to a common length and compute every clip's MFCCs in one call
+        lengths = np.array([len(clip) for clip in clips])
+        padded = np.zeros((len(clips), lengths.max()), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            padded[i, :len(clip)] = clip
+        mfccs = librosa.feature.mfcc(y=padded, sr=sr, n_mfcc=13, hop_length=HOP_LENGTH)  # (n, 13, frames)
+
+        # Mask the frames that only cover padding
+        frames = 1 + lengths // HOP_LENGTH
+        mask = (np.arange(mfccs.shape[-1])[None, :] < frames[:, None])[:, None, :]
+        if VOICE_MODES[version] == "mfcc_mean":
+            return self._masked_mean(mfccs, mask)
+
+        deltas = librosa.feature.delta(mfccs, axis=-1, mode="nearest")
+        deltas2 = librosa.feature.delta(mfccs, order=2, axis=-1, mode="nearest")
+        stacked = np.concatenate([mfccs, deltas, deltas2], axis=1)  # (n, 39, frames)
+        mean = self._masked_mean(stacked, mask)
+        variance = self._masked_mean((stacked - mean[:, :, None]) ** 2, mask)
+        return np.concatenate([mean, np.sqrt(variance)], axis=1).astype(np.float32)
+
+    @staticmethod
+    def _masked_mean(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return (values * mask).sum(axis=-1) / mask.sum(axis=-1)
+
+    def _speaker_embeddings(self, clips: list, sr: int) -> np.ndarray:
+        import torch
+        lengths = np.array([len(clip) for clip in clips])
+        padded = np.zeros((len(clips), lengths.max()), dtype=np.float32)
+        for i, clip in enumerate(clips):
+            padded[i, :len(clip)] = clip
+        with torch.no_grad():
+            embeddings = model_registry.speaker_encoder.encode_batch(
+                torch.from_numpy(padded), wav_lens=torch.from_numpy(lengths / lengths.max()).float()
+            )
+        return embeddings.squeeze(1).cpu().numpy()
+
 
 def extract_voice_features(file: io.BytesIO) -> np.ndarray:
-    return voice_recognition.recognize_voice(file)
+    return model_registry.voice_featurizer.recognize_voice(file)
+
+def extract_voice_features_from_pcm(audio: np.ndarray, sr: int = 16000) -> np.ndarray:
+    return model_registry.voice_featurizer.extract_voice_features(audio, sr)
+
+def extract_voice_embeddings(audio: np.ndarray, sr: int = 16000, versions: list = None) -> dict:
+    """The probe embedding of one clip in every version in `versions` (default VOICE_MATCH_VERSIONS)."""
+    featurizer = model_registry.voice_featurizer
+    return {version: featurizer.extract_voice_features(audio, sr, version) for version in (versions or VOICE_MATCH_VERSIONS)}
+
+def extract_voice_features_batch(clips: list, sr: int = 16000, version: int = None) -> np.ndarray:
+    return model_registry.voice_featurizer.extract_voice_features_batch(clips, sr, version)
+
+
+for _version in VOICE_MATCH_VERSIONS:
+    if _version not in VOICE_MODES or _version not in VOICE_EMBEDDING_DIMS:
+        raise ValueError(f"Unknown voice embedding version: {_version}")
@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RegistrationStore(ABC):
+    """Pending registration state keyed by session id.
+
+    A state is a JSON-serializable dict holding the probe `image_embedding` and
+    `voice_embedding` captured by /auth/api/verify and the Gemini `chat_history`
+    of the registration dialogue. Entries expire `ttl_seconds` after their last write.
+    """
+
+    def __init__(self, ttl_seconds: int = 900):
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, session_id: str):
+        """The state of the session, or None when it is unknown or expired."""
+
+    @abstractmethod
+    def set(self, session_id: str, state: dict):
+        """Stores the state and restarts its expiry."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forgets the state; unknown sessions are ignored."""
+
+
+class InMemoryRegistrationStore(RegistrationStore):
+    """Process-local store; only safe when a single worker serves registrations."""
+
+    def __init__(self, ttl_seconds: int = 900, max_entries: int = 10000):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        while self._entries:
+            session_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[session_id]
+
+    def get(self, session_id: str):
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._entries.get(session_id)
+            return json.loads(entry[1]) if entry else None
+
+    def set(self, session_id: str, state: dict):
+        now = time.monotonic()
+        with self._lock:
+            self._entries.pop(session_id, None)
+            # Entries stay ordered by expiry because every write moves the key to the end
+            self._entries[session_id] = (now + self.ttl_seconds, json.dumps(state))
+            self._evict_expired(now)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+
+class RedisRegistrationStore(RegistrationStore):
+    """Shared store so any worker can continue a registration started on another."""
+
+    def __init__(self, url: str, ttl_seconds: int = 900, prefix: str = "facechat:registration:"):
+        super().__init__(ttl_seconds)
+        import redis
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, session_id: str):
+        value = self._client.get(self.prefix + session_id)
+        return json.loads(value) if value else None
+
+    def set(self, session_id: str, state: dict):
+        self._client.setex(self.prefix + session_id, self.ttl_seconds, json.dumps(state))
+
+    def delete(self, session_id: str):
+        self._client.delete(self.prefix + session_id)
+
+
+def create_registration_store() -> RegistrationStore:
+    backend = os.getenv("REGISTRATION_STORE", "memory")
+    ttl_seconds = int(os.getenv("REGISTRATION_TTL_SECONDS", "900"))
+    if backend == "redis":
+        logger.info("Using Redis registration store")
+        return RedisRegistrationStore(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl_seconds)
+    if backend != "memory":
+        raise ValueError(f"Unknown registration store backend: {backend}")
+    return InMemoryRegistrationStore(ttl_seconds)
+
+
+registration_store = create_registration_store()
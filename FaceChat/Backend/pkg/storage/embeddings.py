@@ -0,0 +1,91 @@
+import base64
+import io
+import logging
+import struct
+import numpy as np
+from database import engine, EMBEDDING_STORAGE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Embeddings are float32 in memory whatever the column type; halfvec only halves what is stored
+EMBEDDING_DTYPE = np.float32
+
+# Big-endian element type of each vector type in the binary COPY / wire format
+_WIRE_DTYPES = {"vector": ">f4", "halfvec": ">f2"}
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+
+
+def as_embedding(values) -> np.ndarray:
+    """A flat float32 array of `values`; float32 ndarrays are returned as views, without copying."""
+    if hasattr(values, "to_numpy"):
+        # halfvec columns are read as pgvector HalfVector objects
+        values = values.to_numpy()
+    return np.asarray(values, dtype=EMBEDDING_DTYPE).reshape(-1)
+
+
+def encode_embedding(values) -> str:
+    """Compact JSON-safe form of an embedding: base64 of its float32 bytes (a quarter of a float list)."""
+    return base64.b64encode(np.ascontiguousarray(as_embedding(values)).tobytes()).decode("ascii")
+
+
+def decode_embedding(value) -> np.ndarray:
+    if isinstance(value, list):
+        # Stored before embeddings were encoded
+        return as_embedding(value)
+    return np.frombuffer(base64.b64decode(value), dtype=EMBEDDING_DTYPE)
+
+
+def _encode_field(value, kind: str) -> bytes:
+    if value is None:
+        return struct.pack(">i", -1)
+    if kind == "int4":
+        return struct.pack(">ii", 4, int(value))
+    if kind == "int8":
+        return struct.pack(">iq", 8, int(value))
+    if kind == "text":
+        data = str(value).encode("utf-8")
+        return struct.pack(">i", len(data)) + data
+    if kind == "embedding":
+        values = as_embedding(value)
+        data = values.astype(_WIRE_DTYPES[EMBEDDING_STORAGE]).tobytes()
+        return struct.pack(">ihh", 4 + len(data), values.shape[0], 0) + data
+    raise ValueError(f"Unsupported binary COPY column kind: {kind}")
+
+
+def binary_copy_buffer(rows, kinds: list) -> io.BytesIO:
+    """Rows in PostgreSQL's binary COPY format; `kinds` gives the kind of every column
+    (int4, int8, text or embedding, the latter written in EMBEDDING_STORAGE)."""
+    buffer = io.BytesIO()
+    buffer.write(_COPY_SIGNATURE)
+    field_count = struct.pack(">h", len(kinds))
+    for row in rows:
+        buffer.write(field_count)
+        for value, kind in zip(row, kinds):
+            buffer.write(_encode_field(value, kind))
+    buffer.write(struct.pack(">h", -1))
+    buffer.seek(0)
+    return buffer
+
+
+def copy_embeddings(cursor, table: str, columns: list, kinds: list, rows) -> int:
+    """COPYs rows into table(columns) in binary, so embeddings travel as raw floats instead of text."""
+    buffer = binary_copy_buffer(rows, kinds)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)", buffer)
+    return cursor.rowcount
+
+
+def copy_rows(table: str, columns: list, kinds: list, rows) -> int:
+    """copy_embeddings in its own transaction on a pooled connection."""
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            copied = copy_embeddings(cursor, table, columns, kinds, rows)
+        connection.commit()
+        return copied
+    except Exception as e:
+        logger.error(f"Binary COPY into {table} failed: {e}")
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
@@ -1,20 +1,34 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-import numpy as np
+from sqlalchemy import select, union, case
 import logging
-import librosa
 import json
 import re
 import os
+from typing import TYPE_CHECKING
 import io
-from pydub import AudioSegment
-from google.generativeai.types.generation_types import StopCandidateException
-import whisper
-import google.generativeai as genai
-from models.user import User
-from pkg.recognition.voice_recognition import extract_voice_features
-from database import get_db
-from pkg.recognition.face_recognition import FaceRecognition
+import asyncio
+import uuid
+from models.user import User, voice_sample_as
+from pkg.recognition.voice_recognition import extract_voice_embeddings, VOICE_EMBEDDING_VERSION, VOICE_MATCH_VERSIONS
+from database import get_db, set_vector_search_params, vector_search_params, HNSW_EF_SEARCH, ASYNC_DATABASE_ENABLED, AsyncSessionLocal
+from pkg.recognition.face_recognition import detect_face
+from pkg.inference.batching import embed_face
+from pkg.inference.executor import inference_executor
+from pkg.audio.ingest import decode_upload
+from pkg.audio.transcription import transcribe_upload
+from pkg.inference.cache import face_cache, voice_cache, upload_digest
+from pkg.session.registration_store import registration_store
+from pkg.storage.embeddings import as_embedding, encode_embedding, decode_embedding
+from pkg.recognition.identification_index import identification_index, IDENTIFICATION_INDEX_ENABLED
+from pkg.recognition.cascade import (
+    VERIFY_MODE, CASCADE_FACE_TOP_K, face_shortlist, face_shortlist_async, decide_on_face, decide_on_voice,
+    voice_versions_needed, record_decision,
+)
+from pkg.llm.client import create_llm_client, user_message as llm_user_message, model_message
+from pkg.llm.resilience import LLMUnavailableError, LLM_FALLBACK_REPLY, is_safety_stop
+from pkg.observability.metrics import stage
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -27,72 +41,114 @@ router = APIRouter()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    # sqlalchemy.ext.asyncio needs greenlet, which is only required with ASYNC_DATABASE
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-#Global Variable for image and voice embeddings, 
-image_embedding = np.array([[]])
-voice_embedding = np.array([[]])
+# Number of nearest users fetched from each ANN index before re-ranking on the combined distance
+IDENTIFICATION_CANDIDATES = int(os.getenv("IDENTIFICATION_CANDIDATES", "50"))
 
 
 #Function for similarity search of voice and image embeddings
-def find_similar_embeddings(db: Session, img_embedding, vce_embedding):
-    similarity_threshold = 0.5
-    img_embedding=img_embedding.tolist()[0]
-    vce_embedding=vce_embedding.tolist()
+def identification_query(img_embedding, vce_embeddings: dict, similarity_threshold: float = 0.5):
+    """Column-only select of the best face + voice match; vce_embeddings maps voice version to probe."""
+    # float32 arrays are bound directly, without building Python lists
+    img_embedding=as_embedding(img_embedding)
+
+    # Calculate similarities; each user is scored with the probe of its own voice version
+    image_similarity = User.face_image.cosine_distance(img_embedding)
+    version_distances = {
+        version: voice_sample_as(version).cosine_distance(as_embedding(embedding))
+        for version, embedding in vce_embeddings.items()
+    }
+    voice_similarity = case(
+        *[(User.voice_version == version, distance) for version, distance in version_distances.items()],
+        else_=None,
+    )
+
+    # Shortlist candidates through the face and per-version voice ANN indexes so the
+    # exact combined ranking below only touches a bounded number of rows
+    candidates = union(
+        select(User.user_id).order_by(image_similarity).limit(IDENTIFICATION_CANDIDATES),
+        *[
+            select(User.user_id).where(User.voice_version == version).order_by(distance).limit(IDENTIFICATION_CANDIDATES)
+            for version, distance in version_distances.items()
+        ],
+    ).subquery()
+
+    return (
+        select(
+            User.user_id,
+            User.name,
+            User.age,
+            User.gender,
+            User.contact,
+            image_similarity.label("image_similarity"),
+            voice_similarity.label("voice_similarity"),
+        )
+        .where(User.user_id.in_(select(candidates.c.user_id)))
+        .where(User.voice_version.in_(list(vce_embeddings)))
+        .where(image_similarity < similarity_threshold)
+        .where(voice_similarity < similarity_threshold)
+        .order_by((image_similarity + voice_similarity).asc())
+        .limit(1)
+    )
+
+def identification_result(row):
+    if row:
+        logger.info(f"Success,Found matching user{row.user_id}")
+        return row.user_id, row.name, row.age, row.gender, row.contact
+    logger.info("No Matching user with the provided embeddings")
+    return 'No Match Found'
+
+def find_similar_embeddings(db: Session, img_embedding, vce_embeddings: dict):
     try:
         logger.info('Searching for Highest similarity among the users')
+        set_vector_search_params(db, ef_search=max(HNSW_EF_SEARCH, IDENTIFICATION_CANDIDATES))
+        row = db.execute(identification_query(img_embedding, vce_embeddings)).one_or_none()
+        return identification_result(row)
+    except Exception as e:
+        logger.error(f"Error in finding the similarity of embeddings{e}")
 
-        # Calculate similarities
-        image_similarity = User.face_image.cosine_distance(img_embedding)
-        voice_similarity = User.voice_sample.cosine_distance(vce_embedding)
-    
-        query = (
-            db.query(
-                User.user_id,  # Assuming the User model has 'id' and 'name' fields
-                User.name,
-                User.age,
-                User.gender,
-                User.contact,
-                image_similarity.label("image_similarity"),
-                voice_similarity.label("voice_similarity"),
-            )
-            .filter(image_similarity < similarity_threshold)
-            .filter(voice_similarity < similarity_threshold)
-            .order_by((image_similarity + voice_similarity).asc())
-            .limit(1)
-            .one_or_none()
-        )
-
-        if query:
-            matched_user_id = query.user_id
-            matched_user_name = query.name
-            matched_user_age=query.age
-            matched_user_gender=query.gender
-            matched_user_contact=query.contact
-            logger.info(f"Success,Found matching user{matched_user_id}")
-            return matched_user_id, matched_user_name,matched_user_age,matched_user_gender,matched_user_contact
-        else:
-            logger.info("No Matching user with the provided embeddings")
-            return 'No Match Found'
-    
+async def find_similar_embeddings_async(db: "AsyncSession", img_embedding, vce_embeddings: dict):
+    try:
+        logger.info('Searching for Highest similarity among the users')
+        await db.execute(vector_search_params(ef_search=max(HNSW_EF_SEARCH, IDENTIFICATION_CANDIDATES)))
+        row = (await db.execute(identification_query(img_embedding, vce_embeddings))).one_or_none()
+        return identification_result(row)
     except Exception as e:
         logger.error(f"Error in finding the similarity of embeddings{e}")
 
-def convert_webm_to_mp3(file_bytes: bytes) -> bytes:
-    audio = AudioSegment.from_file(io.BytesIO(file_bytes), format="webm")
-    mp3_io = io.BytesIO()
-    audio.export(mp3_io, format="mp3")
-    mp3_io.seek(0)
-    return mp3_io.read()
+async def shortlist_faces(db: Session, img_embedding) -> list:
+    """Nearest enrolled faces for the cascade, from the identification index or the face ANN index."""
+    if IDENTIFICATION_INDEX_ENABLED:
+        candidates = identification_index.shortlist(img_embedding, CASCADE_FACE_TOP_K)
+        # Users enrolled by other workers are pulled in before a face is rejected
+        if decide_on_face(candidates) == ("face", None) and identification_index.refresh_due():
+            if await run_in_threadpool(identification_index.refresh, db):
+                candidates = identification_index.shortlist(img_embedding, CASCADE_FACE_TOP_K)
+        return candidates
+    if ASYNC_DATABASE_ENABLED:
+        async with AsyncSessionLocal() as async_db:
+            return await face_shortlist_async(async_db, img_embedding)
+    return await run_in_threadpool(face_shortlist, db, img_embedding)
 
 @router.post('/api/verify')
 async def verify_user(request: Request,face_image: UploadFile = File(...), voice_audio: UploadFile = File(...), db: Session = Depends(get_db)):
     #function to retrieve image embedding
     async def image():
         logger.info("Received image file for verification")
-        try:
+
+        async def compute():
             image_bytes=await face_image.read()
-            face_object= FaceRecognition()
-            pic_embedding= face_object.recognize_face(io.BytesIO(image_bytes))
+            with stage("verify.face_detection"):
+                face= await inference_executor.run(detect_face, image_bytes)
+            with stage("verify.face_embedding"):
+                return await embed_face(face)
+
+        try:
+            # Retries of the same frame are answered from the content cache
+            pic_embedding= await face_cache.get_or_compute(await upload_digest(face_image), compute)
             logger.info(f"Extracted Image vector successfully: {pic_embedding}")
             return pic_embedding
         
@@ -100,29 +156,62 @@ async def verify_user(request: Request,face_image: UploadFile = File(...), voice
             logger.error(f"Error in extracting the image embedding or similarity search in DB {e}")
             raise
     
-    #function to retrieve voice embedding
-    async def voice():
+    #function to retrieve voice embedding, in every version of `versions` (default VOICE_MATCH_VERSIONS)
+    async def voice(versions: list = None):
         logger.info("Received voice file for verification")
+        versions = versions or VOICE_MATCH_VERSIONS
+        # A cascade may embed the clip a second time, after an earlier decode read it to the end
+        await voice_audio.seek(0)
+
+        async def compute():
+            with stage("verify.audio_decode"):
+                audio = await decode_upload(voice_audio)
+            with stage("verify.voice_embedding"):
+                return await inference_executor.run(extract_voice_embeddings, audio, versions=versions)
+
         try:
-            file_bytes = await voice_audio.read()
-            mp3_file_bytes = convert_webm_to_mp3(file_bytes)
-            sound_embedding = extract_voice_features(io.BytesIO(mp3_file_bytes))
+            cache_key = ",".join(str(version) for version in versions)
+            sound_embedding = await voice_cache.get_or_compute(await upload_digest(voice_audio, cache_key), compute)
             logger.info(f"Extracted voice vector: {sound_embedding}")
             return sound_embedding
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error extracting voice vector: {e}")
             raise HTTPException(status_code=500, detail="Error extracting voice vector")
 
         
-    global image_embedding
-    image_embedding= await image()
-    global voice_embedding
-    voice_embedding=await voice()
-   
-    
-    #Handling the result got from the similarity search
-    search_result= find_similar_embeddings(db,image_embedding,voice_embedding)
+    if VERIFY_MODE == "cascade":
+        # The face decides alone when it is confident; voice is only computed for ambiguous faces
+        image_embedding = await image()
+        voice_embedding = None
+        with stage("verify.face_shortlist"):
+            candidates = await shortlist_faces(db, image_embedding)
+        decision = decide_on_face(candidates)
+        if decision is None:
+            versions = voice_versions_needed(candidates)
+            voice_embedding = await voice(versions) if versions else {}
+            with stage("verify.voice_scoring"):
+                decision = decide_on_voice(candidates, voice_embedding)
+        decided_by, match = decision
+        search_result = match if match is not None else 'No Match Found'
+    else:
+        # Face and voice pipelines run concurrently on the inference executor
+        image_embedding, voice_embedding = await asyncio.gather(image(), voice())
+
+        #Handling the result got from the similarity search
+        with stage("verify.identification"):
+            if IDENTIFICATION_INDEX_ENABLED:
+                search_result= await run_in_threadpool(identification_index.find_similar_embeddings,db,image_embedding,voice_embedding)
+            elif ASYNC_DATABASE_ENABLED:
+                async with AsyncSessionLocal() as async_db:
+                    search_result= await find_similar_embeddings_async(async_db,image_embedding,voice_embedding)
+            else:
+                search_result= await run_in_threadpool(find_similar_embeddings,db,image_embedding,voice_embedding)
+        decided_by = "combined"
+        match = search_result if isinstance(search_result, tuple) else None
+    record_decision(decided_by, match)
     
     
     #checking if the returned item is a tuple with userid and user name, if yes user_id and name is provided to the prompt
@@ -143,10 +232,23 @@ async def verify_user(request: Request,face_image: UploadFile = File(...), voice
         #User Found and Getting response from Gemini
         verified_message=f"Welcome back {user_dict['name']}, what can i help you with today? "
         logger.info(f"Verification done and the verified message with name of the user is sent to frontend: {verified_message}")
-        return {'status': 'verified', "responseText": verified_message}
+        return {'status': 'verified', "responseText": verified_message, "decidedBy": decided_by}
     else:
         logger.info("No matching user found")
-        return {'status': 'error', 'responseText':'Seems like You are new here, please register with us , to continue.'}
+        if voice_embedding is None or VOICE_EMBEDDING_VERSION not in voice_embedding:
+            # A cascade that decided without this voice version still needs it to enroll the user
+            voice_embedding = await voice([VOICE_EMBEDDING_VERSION])
+
+        # Keep the probe embeddings for this session so /api/register can enroll them
+        registration_id = uuid.uuid4().hex
+        request.session['registration_id'] = registration_id
+        await run_in_threadpool(registration_store.set, registration_id, {
+            'image_embedding': encode_embedding(image_embedding),
+            'voice_embedding': encode_embedding(voice_embedding[VOICE_EMBEDDING_VERSION]),
+            'voice_version': VOICE_EMBEDDING_VERSION,
+            'chat_history': initial_chat_history,
+        })
+        return {'status': 'error', 'responseText':'Seems like You are new here, please register with us , to continue.', "decidedBy": decided_by}
     
 
 
@@ -157,15 +259,6 @@ async def verify_user(request: Request,face_image: UploadFile = File(...), voice
 
 
 
-# Retrieve the API key from environment variables
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-
-genai.configure(api_key=gemini_api_key)
-
-
-# Load the Whisper model
-whisper_model = whisper.load_model("tiny.en")
-
 # Initialize the LangChain prompt template
 instruction = (
     """
@@ -196,48 +289,46 @@ instruction = (
 )
 
 
-# Initialize the Generative Model
-model = genai.GenerativeModel(
-    "gemini-1.5-flash",
-    system_instruction=instruction,
-    safety_settings={
-        'HATE': 'BLOCK_NONE',
-        'HARASSMENT': 'BLOCK_NONE',
-        'SEXUAL': 'BLOCK_NONE',
-        'DANGEROUS': 'BLOCK_NONE'
-    }
-)
-
-# Start a chat session
-chat = model.start_chat(
-    history=[
-        {"role": "user", "parts": "Hello"},
-        {"role": "model", "parts": "Great to meet you. What would you like to know?"},
-    ]
-)
+# Registration chat model, created once and shared by all registration sessions
+registration_llm = create_llm_client("registration", "gemini", "gemini-1.5-flash", system_instruction=instruction)
 
-# Track user state in a global dictionary (or use session/database)
-user_states = {}
+# Every registration starts its own chat session from this history
+initial_chat_history = [
+    {"role": "user", "parts": ["Hello"]},
+    {"role": "model", "parts": ["Great to meet you. What would you like to know?"]},
+]
 
 @router.post("/api/register")
 async def register_user(request: Request, db: Session = Depends(get_db),voice_file: UploadFile = File(...)):
+    registration_id = request.session.get('registration_id')
+    state = await run_in_threadpool(registration_store.get, registration_id) if registration_id else None
+    if state is None:
+        raise HTTPException(status_code=400, detail="Registration session expired, please verify again")
+
     try:
         # Step 1: Process the audio file
-        file_bytes = await voice_file.read()
-        mp3_file_bytes = convert_webm_to_mp3(file_bytes)
-        audio_np, _ = librosa.load(io.BytesIO(mp3_file_bytes), sr=16000)
-        audio_transcription = whisper_model.transcribe(audio_np)
-        user_message = audio_transcription["text"]
+        with stage("register.transcription"):
+            user_message = await transcribe_upload(voice_file)
         logger.info(f"Transcribed user message: {user_message}")
         
-        response = chat.send_message(user_message)
-        response_text = response.text
+        messages = state['chat_history'] + [llm_user_message(user_message)]
+        try:
+            with stage("register.llm"):
+                # Scoped to the registration: every applicant starts from the same history
+                response_text = await registration_llm.generate(messages, cache_scope=registration_id, cache_query=user_message)
+        except LLMUnavailableError as e:
+            # The registration state is left untouched so the user can simply repeat the answer
+            logger.error(f"LLM unavailable, sending fallback reply: {e}")
+            return {"status":"processing","responseText": LLM_FALLBACK_REPLY}
         logger.info(f"LLM response: {response_text}")
 
+        state['chat_history'] = messages + [model_message(response_text)]
+        await run_in_threadpool(registration_store.set, registration_id, state)
+
 
         json_pattern = re.search(r'```json\s*(\{.*\})\s*```', response_text, re.DOTALL)
         # Step 2: Identify the JSON block in the response
-        if "completed" in response.text.lower():
+        if "completed" in response_text.lower():
             
             if json_pattern:
                 json_str = json_pattern.group(1)
@@ -247,16 +338,25 @@ async def register_user(request: Request, db: Session = Depends(get_db),voice_fi
                     logger.info(f"Extracted user details: {user_details}")
                     
                     # Step 4: Store the data in the database
+                    face_embedding = decode_embedding(state['image_embedding'])
+                    voice_embedding = decode_embedding(state['voice_embedding'])
                     new_user = User(
                         name=user_details["name"],
                         age=user_details["age"],
                         gender=user_details["gender"],
                         contact=user_details["contact"],
-                        face_image=image_embedding.tolist()[0],
-                        voice_sample=voice_embedding.tolist(),  # Ensure correct key names
+                        face_image=face_embedding,
+                        voice_sample=voice_embedding,
+                        voice_version=state['voice_version'],
                     )
                     db.add(new_user)
-                    db.commit()
+                    with stage("register.db_commit"):
+                        await run_in_threadpool(db.commit)
+                    await run_in_threadpool(registration_store.delete, registration_id)
+                    if IDENTIFICATION_INDEX_ENABLED:
+                        identification_index.add(new_user.user_id, face_embedding, voice_embedding, state['voice_version'],
+                                                 (new_user.user_id, new_user.name, new_user.age, new_user.gender, new_user.contact))
+                    request.session.pop('registration_id', None)
                     logger.info(f"New User id {new_user.user_id} ")
                     request.session['user_id'] = new_user.user_id
                     request.session["registered_user_details"] = user_details
@@ -270,9 +370,11 @@ async def register_user(request: Request, db: Session = Depends(get_db),voice_fi
         else :
             return {"status":"processing","responseText": f"{response_text}"}
                 
-    except StopCandidateException as e:
-        logger.error(f"Model stopped due to safety concerns: {e}")
-        raise HTTPException(status_code=400, detail="The input was flagged by the model's safety checks. Please try again with different input.")
+    except HTTPException:
+        raise
     except Exception as e:
+        if is_safety_stop(e):
+            logger.error(f"Model stopped due to safety concerns: {e}")
+            raise HTTPException(status_code=400, detail="The input was flagged by the model's safety checks. Please try again with different input.")
         logger.error(f"Error processing request: {e}")
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy import select, func, Float
 import logging
+import asyncio
+import json
 import numpy as np
-import whisper
 import io
 import os
-import math
-from pydub import AudioSegment
-import librosa
-from sentence_transformers import SentenceTransformer
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from database import get_db
-from models.user import User
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_google_vertexai import ChatVertexAI
-import vertexai
+from database import get_db, SessionLocal, ASYNC_DATABASE_ENABLED, AsyncSessionLocal
+from models.conversation import ConversationTurn
+from pkg.inference.batching import encode_sentence, transcribe_audio
+from pkg.inference.model_registry import model_registry
+from pkg.conversation.persistence import turn_writer
+from pkg.conversation.context import assemble_context, estimate_tokens, format_user_details
+from pkg.audio.ingest import StreamingDecoder, SAMPLE_RATE
+from pkg.audio.transcription import transcribe_upload
+from pkg.llm.client import create_llm_client, user_message as llm_user_message
+from pkg.llm.resilience import LLMUnavailableError, LLM_FALLBACK_REPLY
+from pkg.observability.metrics import stage
 
 
 router = APIRouter()
@@ -27,9 +31,21 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-# Initialize Whisper
-whisper_model = whisper.load_model("tiny.en")
+# Retrieval of previous turns used as prompt context
+CONTEXT_TOP_K = int(os.getenv("CONTEXT_TOP_K", "5"))
+CONTEXT_SIMILARITY_FLOOR = float(os.getenv("CONTEXT_SIMILARITY_FLOOR", "0.5"))
+CONTEXT_RECENCY_WEIGHT = float(os.getenv("CONTEXT_RECENCY_WEIGHT", "0.0"))
+CONTEXT_RECENCY_HALF_LIFE_HOURS = float(os.getenv("CONTEXT_RECENCY_HALF_LIFE_HOURS", "72"))
+CONTEXT_LAST_N = int(os.getenv("CONTEXT_LAST_N", "5"))
+
+# Seconds of newly received audio between partial transcriptions on the streaming endpoint
+STREAM_PARTIAL_INTERVAL = float(os.getenv("STREAM_PARTIAL_INTERVAL", "1.0"))
+# Longest audio segment transcribed for one partial; longer utterances are transcribed in
+# consecutive segments, so each partial costs the same however long the user speaks
+STREAM_PARTIAL_WINDOW = float(os.getenv("STREAM_PARTIAL_WINDOW", "15"))
 
 
 # Initialize LangChain prompt template
@@ -48,133 +64,89 @@ Assistant:
 
 system_template='You are a helpful assistant. Your task is to respond to the users queries based on the information you have. Dont include emojis in the response. '
 
-#Intializing the vertexai with the cloud project
-project_key = os.getenv("PROJECT_NAME")
-google_credential_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS_PATH")
+#Vertex AI chat model with the system prompt, created once; the user prompt is user_template filled per request
+conversation_llm=create_llm_client("conversation","vertex","gemini-1.5-flash",system_instruction=system_template)
 
-vertexai.init(project=project_key)
-os.environ['GOOGLE_APPLICATION_CREDENTIALS']=google_credential_path
+def chain_messages(chain_input: dict) -> list:
+    return [llm_user_message(user_template.format(**chain_input))]
 
-llm_model=ChatVertexAI(model='gemini-1.5-flash')
+def chain_cache_args(user_id: int, chain_input: dict) -> dict:
+    #the prompt carries the user's details and history, so cached answers are only shared
+    #within the same user and context; the semantic cache compares the raw queries
+    context = {key: value for key, value in chain_input.items() if key != 'user_input'}
+    return {'cache_scope': [user_id, context], 'cache_query': chain_input['user_input']}
 
-prompt_template=ChatPromptTemplate(
-    [('system',system_template),('user',user_template)]
-)
 
-parser=StrOutputParser()
 
-#Making a chain which automates the feeding of each component outputs
-chain=prompt_template | llm_model | parser
+def similar_conversations_query(user_id: int, input_embedding, top_k: int = None,
+                                similarity_floor: float = None, recency_weight: float = None):
+    """Top-k turns of the user ranked by similarity to the input, optionally blended with recency.
 
+    A turn's similarity is the best cosine similarity of its query or response embedding.
+    Every turn of the user is scored exactly: the turns are found through the (user_id,
+    created_at) index and retention bounds their number. A global ANN index would pick its
+    candidates among all users' turns before the user filter, losing recall as users grow.
+    """
+    top_k = CONTEXT_TOP_K if top_k is None else top_k
+    similarity_floor = CONTEXT_SIMILARITY_FLOOR if similarity_floor is None else similarity_floor
+    recency_weight = CONTEXT_RECENCY_WEIGHT if recency_weight is None else recency_weight
 
+    query_distance = ConversationTurn.query_embedding.cosine_distance(input_embedding)
+    response_distance = ConversationTurn.response_embedding.cosine_distance(input_embedding)
+    similarity = 1 - func.least(query_distance, response_distance, type_=Float)
+    age_hours = func.extract('epoch', func.now() - ConversationTurn.created_at) / 3600.0
+    recency = func.power(0.5, age_hours / CONTEXT_RECENCY_HALF_LIFE_HOURS, type_=Float)
+    score = (1 - recency_weight) * similarity + recency_weight * recency
 
-def update_user_conversations(db: Session, user_id: int, new_conversations: str, new_conv_embedding: np.ndarray):
-    try:
-        # Query the user by ID
-        user = db.query(User).filter(User.user_id == user_id).one_or_none()
-        if not user:
-            logger.error(f"User with ID {user_id} not found")
-            return None
-        
-        # Append the new conversations to the existing ones
-        if user.conversations is None:
-            user.conversations=[]
-        
-        user.conversations.append(new_conversations)
-        flag_modified(user, "conversations")
-        logger.info("Successfully updated text conversations in database")
-        
-        #  append the new one if the conv embedding already exists
-        if user.conv_embedding:
-            numpy_embedding=np.array(user.conv_embedding)
-            updated_embedding = np.concatenate((numpy_embedding, new_conv_embedding), axis=0)
-            updated_embedding=updated_embedding.tolist()
-        else:
-            updated_embedding = new_conv_embedding.tolist()
-        
-        #limiting the conv embedding to 1000
-        user.conv_embedding = updated_embedding[:1000]
-        flag_modified(user, "conv_embedding") 
-        
-        # Commit the session to the database
-        db.commit()
-        db.refresh(user)
-        logger.info('Successfully Updated the User Conversations and Embeddings in the Database')
-        return user
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error updating user conversations and embeddings: {e}")
-        return None
-
-def convert_webm_to_mp3(file_bytes: bytes) -> bytes:
-    audio = AudioSegment.from_file(io.BytesIO(file_bytes), format="webm")
-    mp3_io = io.BytesIO()
-    audio.export(mp3_io, format="mp3")
-    mp3_io.seek(0)
-    return mp3_io.read()
-
- #creating conversation embeddings and pushing to database, along with normal conv text
-def text_embeddings(db: Session,user_id,user_response,llm_response):
+    return (
+        select(ConversationTurn.turn_id, ConversationTurn.conversation, similarity.label('similarity'), score.label('score'))
+        .where(ConversationTurn.user_id == user_id)
+        .where(similarity >= similarity_floor)
+        .order_by(score.desc())
+        .limit(top_k)
+    )
+
+def last_conversations_query(user_id: int, count: int = None):
+    """The user's most recent turns, newest first, served by the (user_id, created_at) index."""
+    count = CONTEXT_LAST_N if count is None else count
+    return (
+        select(ConversationTurn.turn_id, ConversationTurn.conversation)
+        .where(ConversationTurn.user_id == user_id)
+        .order_by(ConversationTurn.created_at.desc(), ConversationTurn.turn_id.desc())
+        .limit(count)
+    )
+
+def similar_conversations(db: Session, user_id: int, input_embedding, top_k: int = None,
+                          similarity_floor: float = None, recency_weight: float = None):
+    return db.execute(similar_conversations_query(user_id, input_embedding, top_k, similarity_floor, recency_weight)).all()
+
+def last_conversations(db: Session, user_id: int, count: int = None):
+    """The user's most recent turns in chronological order."""
+    return db.execute(last_conversations_query(user_id, count)).all()[::-1]
+
+def format_context(similar_turns, last_turns):
+    #total_context stores the similar conv from user's chat history, last_5_conv the previous chats of that user,
+    #both deduplicated and fitted into the context token budget
+    total_context,last_5_conv,_=assemble_context(last_turns,similar_turns)
+    logger.info('Successfully retrieved similar conversations and last 5 conv of the user from his chat history')
+    return total_context,last_5_conv
+
+def context_extraction(db : Session,user_id: int,input_text: str,input_embedding: np.ndarray = None):
     try:
-        model=  SentenceTransformer('all-MiniLM-L6-v2')
-        sentences=[]
-        sentences.append(user_response)
-        sentences.append(llm_response)
-    
-        #text conversation, both - user response and llm response combined
-        combined_text_convo='User Query : '+ user_response +'\n'+ 'Assistant Response : '+ llm_response + '\n'
+        if input_embedding is None:
+            input_embedding=model_registry.sentence_encoder.encode([input_text],normalize_embeddings=True)[0]
+        return format_context(similar_conversations(db,user_id,input_embedding),last_conversations(db,user_id))
     
-        #conv embedding created
-        conv_embedding=model.encode(sentences,normalize_embeddings=True)
-        
-        logger.info(f"Conversation embedding created successfully,{conv_embedding}")
-        
-        update_user_conversations(db,user_id,combined_text_convo,conv_embedding)
-        logger.info("User conversation pushed to database successfully")
     except Exception as e:
-        logger.error(f"creating text embedding failed{e}")
+        logger.error(f"Error in finding the similar conversations of the user from his chat history{e}")
         raise
-        
-def context_extraction(db : Session,user_id: int,input_text: str):
+
+async def context_extraction_async(db: "AsyncSession", user_id: int, input_embedding: np.ndarray):
     try:
-        sentence=[]
-        conv_context=[]
-        total_context=''
-        last_5_conv=''
-        
-        sentence.append(input_text)
-        model= SentenceTransformer('all-MiniLM-L6-v2')
-        
-        input_embedding=model.encode(sentence,normalize_embeddings=True)
-        input_embedding=input_embedding.astype(np.float64)
-        
-        user=db.query(User).filter(User.user_id==user_id).one_or_none()
-        if not user:
-            logger.error(f"No such user in the database, user_id ;{user_id}")
-        
-        if user.conversations:
-            search_result=model.similarity(np.array(user.conv_embedding).astype(np.float64),input_embedding)
-            result=search_result.tolist()
-            for index,value in enumerate(result):
-                if value[0]>=0.50:
-                    if user.conversations[math.floor(index/2)] in conv_context:
-                        continue
-                    else:
-                        conv_context.append(user.conversations[math.floor(index/2)])
-        
-        
-        #total_context stores the similar conv from user's chat history
-            for text in conv_context:
-                total_context+=text + '\n'
-        
-        #last_5_conv stores the previous 5 chats of that user
-            for conv in user.conversations[-5:]:
-                last_5_conv+=conv + '\n'
-        
-                
-        logger.info('Successfully retrieved similar conversations and last 5 conv of the user from his chat history')
-        return total_context,last_5_conv
-    
+        similar_turns=(await db.execute(similar_conversations_query(user_id,input_embedding))).all()
+        last_turns=(await db.execute(last_conversations_query(user_id))).all()[::-1]
+        return format_context(similar_turns,last_turns)
+
     except Exception as e:
         logger.error(f"Error in finding the similar conversations of the user from his chat history{e}")
         raise
@@ -182,6 +154,27 @@ def context_extraction(db : Session,user_id: int,input_text: str):
 
     
 
+def session_user_details(session) -> dict:
+    #storing the user details for any further uses in conversations
+    if session.get('registered_user_details'):
+        return session.get('registered_user_details')
+    return session.get('verified_user_details')
+
+async def build_chain_input(db: Session, user_id: int, user_details: dict, user_message: str) -> dict:
+    with stage("conversation.sentence_embedding"):
+        input_embedding=await encode_sentence(user_message)
+    with stage("conversation.context_extraction"):
+        if ASYNC_DATABASE_ENABLED:
+            async with AsyncSessionLocal() as async_db:
+                user_conv_context=await context_extraction_async(async_db,user_id,input_embedding)
+        else:
+            user_conv_context=await run_in_threadpool(context_extraction,db,user_id,user_message,input_embedding)
+    chain_input={'user_data':format_user_details(user_details),'last_5_chats':user_conv_context[1],
+                 'similar_conv':user_conv_context[0],'user_input':user_message}
+    prompt_tokens=estimate_tokens(system_template)+estimate_tokens(user_template.format(**chain_input))
+    logger.info(f"Prompt tokens for user {user_id}: {prompt_tokens}")
+    return chain_input
+
 @router.post("/api/conversation")
 async def handle_conversation(request: Request,audio_file: UploadFile = File(...),db: Session = Depends(get_db)):
     
@@ -190,22 +183,15 @@ async def handle_conversation(request: Request,audio_file: UploadFile = File(...
     if user_id is None:
         raise HTTPException(status_code=401, detail="User not authenticated")
     
-    
-    #storing the user details for any further uses in conversations
-    if request.session.get('registered_user_details'):
-        user_details=request.session.get('registered_user_details')
-    else:
-        user_details=request.session.get('verified_user_details')
-        
+    user_details=session_user_details(request.session)
     
     #voice processing with whisper, converted to text
     try:
-        file_bytes = await audio_file.read()
-        mp3_file_bytes=convert_webm_to_mp3(file_bytes)
-        audio_np, _ = librosa.load(io.BytesIO(mp3_file_bytes), sr=16000)
-        audio_transcription = whisper_model.transcribe(audio_np)
-        user_message = audio_transcription["text"]
+        with stage("conversation.transcription"):
+            user_message = await transcribe_upload(audio_file)
         logger.info(f"Transcribed user message: {user_message}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing audio file: {e}")
         raise HTTPException(status_code=500, detail="Error processing audio file")
@@ -213,17 +199,115 @@ async def handle_conversation(request: Request,audio_file: UploadFile = File(...
     
     # Generate a response using the Gemini API
     try:
-        user_conv_context=context_extraction(db,user_id,user_message)
-        generated_text=chain.invoke({'user_data':user_details,'last_5_chats':user_conv_context[1],
-                                     'similar_conv':user_conv_context[0],'user_input':user_message})
+        chain_input=await build_chain_input(db,user_id,user_details,user_message)
+        with stage("conversation.llm"):
+            generated_text=await conversation_llm.generate(chain_messages(chain_input), **chain_cache_args(user_id, chain_input))
         logger.info(f"Generated response: {generated_text}")
+    except LLMUnavailableError as e:
+        # Fail fast with a spoken apology instead of holding the request; the turn is not stored
+        logger.error(f"LLM unavailable, sending fallback reply: {e}")
+        return {"responseText": LLM_FALLBACK_REPLY}
     except Exception as e:
         logger.error(f"Error generating response: {e}")
         raise HTTPException(status_code=500, detail="Error generating response")
     
-    #function to create and update text embeddings to database
-    text_embeddings(db,user_id,user_message,generated_text)
+    # Embedding and storing the turn happens on the write-behind queue, after the response
+    await turn_writer.submit(user_id,user_message,generated_text)
 
     return {
         "responseText": generated_text
     }
+
+
+@router.websocket("/ws/conversation")
+async def stream_conversation(websocket: WebSocket):
+    """Streaming variant of /api/conversation.
+
+    The client sends encoded audio chunks as binary frames while the user speaks and a
+    text frame {"type": "end"} when done. The server replies with JSON frames:
+    "partial_transcript" while audio arrives, the final "transcript", one "token" frame
+    per LLM chunk as it is generated, then "done" with the full response text.
+    """
+    await websocket.accept()
+    user_id = websocket.session.get('user_id')
+    if user_id is None:
+        await websocket.send_json({"type": "error", "detail": "User not authenticated"})
+        await websocket.close(code=4401)
+        return
+    user_details = session_user_details(websocket.session)
+
+    decoder = StreamingDecoder()
+    partial_task = None
+    transcribed_samples = 0
+    # Partials transcribe audio from segment_start on; once that exceeds the window, the
+    # segment's latest text is kept and a new segment starts where that text ended
+    segment_texts = []
+    segment_start = segment_end = 0
+    segment_text = ""
+
+    async def send_partial(audio: np.ndarray):
+        nonlocal segment_start, segment_end, segment_text
+        try:
+            if len(audio) - segment_start > STREAM_PARTIAL_WINDOW * SAMPLE_RATE and segment_end > segment_start:
+                segment_texts.append(segment_text)
+                segment_start = segment_end
+            segment_text = await transcribe_audio(audio[segment_start:])
+            segment_end = len(audio)
+            text = " ".join(part.strip() for part in segment_texts + [segment_text] if part.strip())
+            await websocket.send_json({"type": "partial_transcript", "text": text})
+        except Exception as e:
+            logger.warning(f"Skipping partial transcription: {e}")
+
+    try:
+        # Receive audio until the client signals the end of the utterance
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes"):
+                await run_in_threadpool(decoder.feed, message["bytes"])
+                audio = decoder.pcm()
+                new_audio = len(audio) - transcribed_samples
+                if new_audio >= STREAM_PARTIAL_INTERVAL * SAMPLE_RATE and (partial_task is None or partial_task.done()):
+                    transcribed_samples = len(audio)
+                    partial_task = asyncio.create_task(send_partial(audio))
+            elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                break
+
+        if partial_task is not None:
+            partial_task.cancel()
+        audio = await run_in_threadpool(decoder.close)
+        with stage("conversation.transcription"):
+            user_message = await transcribe_audio(audio)
+        logger.info(f"Transcribed user message: {user_message}")
+        await websocket.send_json({"type": "transcript", "text": user_message})
+
+        # A session only for the retrieval: the socket stays open for the whole utterance and
+        # answer, and must not hold a pooled connection meanwhile (turns are written by turn_writer)
+        with SessionLocal() as db:
+            chain_input = await build_chain_input(db, user_id, user_details, user_message)
+        chunks = []
+        try:
+            with stage("conversation.llm_stream"):
+                async for chunk in conversation_llm.stream(chain_messages(chain_input), **chain_cache_args(user_id, chain_input)):
+                    chunks.append(chunk)
+                    await websocket.send_json({"type": "token", "text": chunk})
+        except LLMUnavailableError as e:
+            logger.error(f"LLM unavailable, sending fallback reply: {e}")
+            await websocket.send_json({"type": "done", "responseText": LLM_FALLBACK_REPLY, "fallback": True})
+            await websocket.close()
+            return
+        generated_text = "".join(chunks)
+        logger.info(f"Generated response: {generated_text}")
+        await websocket.send_json({"type": "done", "responseText": generated_text})
+
+        await turn_writer.submit(user_id, user_message, generated_text)
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Client disconnected from the conversation stream")
+        decoder.abort()
+    except Exception as e:
+        logger.error(f"Error in streaming conversation: {e}")
+        decoder.abort()
+        await websocket.send_json({"type": "error", "detail": "Error processing conversation"})
+        await websocket.close(code=1011)
@@ -0,0 +1,219 @@
+"""Bulk enrollment and re-embedding of users.
+
+ingest   Enrolls new users from a manifest CSV (name,age,gender,contact,face,voice)
+         or a directory with one sub-directory per person holding info.json
+         ({"name", "age", "gender", "contact"}), one face image and one voice clip.
+         Rows are written with binary COPY.
+reembed  Recomputes face_image/voice_sample of existing users from a manifest CSV
+         (user_id,face,voice), e.g. after changing the embedding model or moving to
+         a new VOICE_EMBEDDING_VERSION. Work is done
+         in chunks of ascending user_id and the last finished user_id is written to
+         a checkpoint file, so an interrupted run resumes where it stopped.
+
+Embeddings are computed in a process pool; each worker loads the models once.
+Voice embeddings are written in VOICE_EMBEDDING_VERSION (or --voice-version).
+
+    python scripts/enroll.py ingest --directory people/ --workers 8
+    python scripts/enroll.py reembed --manifest media.csv --checkpoint reembed.ckpt --voice-version 2
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import engine, EMBEDDING_STORAGE
+from pkg.storage.embeddings import as_embedding, copy_embeddings, copy_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+AUDIO_EXTENSIONS = (".webm", ".wav", ".mp3", ".ogg", ".m4a", ".flac")
+
+
+def load_worker_models():
+    from pkg.inference.model_registry import model_registry
+    model_registry.face_embedder
+    model_registry.voice_featurizer
+
+
+def embed_media(face_path: str, voice_path: str, voice_version: int):
+    """Runs in a pool worker; returns (face_embedding, voice_embedding) as float32 arrays, or an error string."""
+    from pkg.audio.ingest import decode_to_pcm, SAMPLE_RATE
+    from pkg.inference.model_registry import model_registry
+    from pkg.recognition.face_recognition import recognize_face
+    try:
+        with open(face_path, "rb") as face_file:
+            face_embedding = recognize_face(face_file.read())
+        with open(voice_path, "rb") as voice_file:
+            voice_embedding = model_registry.voice_featurizer.extract_voice_features(
+                decode_to_pcm(voice_file.read()), SAMPLE_RATE, voice_version
+            )
+        return as_embedding(face_embedding), as_embedding(voice_embedding)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def read_manifest(path: str) -> list:
+    with open(path, newline="") as manifest:
+        return list(csv.DictReader(manifest))
+
+
+def read_directory(path: str) -> list:
+    records = []
+    for name in sorted(os.listdir(path)):
+        person_dir = os.path.join(path, name)
+        if not os.path.isdir(person_dir):
+            continue
+        files = sorted(os.listdir(person_dir))
+        faces = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS)]
+        voices = [f for f in files if f.lower().endswith(AUDIO_EXTENSIONS)]
+        if "info.json" not in files or not faces or not voices:
+            logger.warning(f"Skipping {person_dir}: needs info.json, a face image and a voice clip")
+            continue
+        with open(os.path.join(person_dir, "info.json")) as info_file:
+            record = json.load(info_file)
+        record["face"] = os.path.join(person_dir, faces[0])
+        record["voice"] = os.path.join(person_dir, voices[0])
+        records.append(record)
+    return records
+
+
+def chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Progress:
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def update(self, done: int, failed: int):
+        self.done += done
+        self.failed += failed
+        elapsed = time.perf_counter() - self.started
+        logger.info(
+            f"{self.done + self.failed}/{self.total} processed, {self.done} written, {self.failed} failed, "
+            f"{self.done / elapsed:.1f} users/s"
+        )
+
+
+def embed_chunk(pool, chunk: list, voice_version: int) -> list:
+    results = pool.map(
+        embed_media,
+        [record["face"] for record in chunk],
+        [record["voice"] for record in chunk],
+        [voice_version] * len(chunk),
+    )
+    embedded = []
+    for record, result in zip(chunk, results):
+        if isinstance(result, str):
+            logger.warning(f"Skipping {record.get('name') or record.get('user_id')}: {result}")
+        else:
+            embedded.append((record, result))
+    return embedded
+
+
+def copy_users(embedded: list, voice_version: int):
+    copy_rows(
+        "users",
+        ["name", "age", "gender", "contact", "face_image", "voice_sample", "voice_version"],
+        ["text", "int4", "text", "text", "embedding", "embedding", "int4"],
+        (
+            (record["name"], record["age"], record["gender"], record["contact"], face_embedding, voice_embedding, voice_version)
+            for record, (face_embedding, voice_embedding) in embedded
+        ),
+    )
+
+
+def update_embeddings(embedded: list, voice_version: int):
+    """COPYs the new embeddings into a temporary table and updates users from it in one statement."""
+    if not embedded:
+        return
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMP TABLE reembedded (user_id integer, face_image {EMBEDDING_STORAGE}, "
+                f"voice_sample {EMBEDDING_STORAGE}) ON COMMIT DROP"
+            )
+            copy_embeddings(
+                cursor, "reembedded", ["user_id", "face_image", "voice_sample"], ["int4", "embedding", "embedding"],
+                ((record["user_id"], face_embedding, voice_embedding) for record, (face_embedding, voice_embedding) in embedded),
+            )
+            cursor.execute(
+                "UPDATE users SET face_image = r.face_image, voice_sample = r.voice_sample, voice_version = %s "
+                "FROM reembedded r WHERE users.user_id = r.user_id",
+                (voice_version,),
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def ingest(args):
+    records = read_manifest(args.manifest) if args.manifest else read_directory(args.directory)
+    progress = Progress(len(records))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=load_worker_models) as pool:
+        for chunk in chunks(records, args.chunk_size):
+            embedded = embed_chunk(pool, chunk, args.voice_version)
+            if embedded:
+                copy_users(embedded, args.voice_version)
+            progress.update(len(embedded), len(chunk) - len(embedded))
+
+
+def reembed(args):
+    records = sorted(read_manifest(args.manifest), key=lambda record: int(record["user_id"]))
+    last_done = 0
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as checkpoint:
+            last_done = int(checkpoint.read().strip() or 0)
+        logger.info(f"Resuming after user_id {last_done}")
+    records = [record for record in records if int(record["user_id"]) > last_done]
+
+    progress = Progress(len(records))
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=load_worker_models) as pool:
+        for chunk in chunks(records, args.chunk_size):
+            embedded = embed_chunk(pool, chunk, args.voice_version)
+            update_embeddings(embedded, args.voice_version)
+            if args.checkpoint:
+                with open(args.checkpoint, "w") as checkpoint:
+                    checkpoint.write(str(chunk[-1]["user_id"]))
+            progress.update(len(embedded), len(chunk) - len(embedded))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="enroll new users")
+    source = ingest_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="CSV with name,age,gender,contact,face,voice columns")
+    source.add_argument("--directory", help="directory with one sub-directory per person")
+    ingest_parser.set_defaults(handler=ingest)
+
+    reembed_parser = subparsers.add_parser("reembed", help="recompute embeddings of existing users")
+    reembed_parser.add_argument("--manifest", required=True, help="CSV with user_id,face,voice columns")
+    reembed_parser.add_argument("--checkpoint", help="file recording the last re-embedded user_id")
+    reembed_parser.set_defaults(handler=reembed)
+
+    for sub in (ingest_parser, reembed_parser):
+        sub.add_argument("--workers", type=int, default=os.cpu_count())
+        sub.add_argument("--chunk-size", type=int, default=500)
+        sub.add_argument("--voice-version", type=int, default=int(os.getenv("VOICE_EMBEDDING_VERSION", "1")),
+                         help="voice embedding version to write")
+
+    args = parser.parse_args()
+    args.handler(args)
@@ -0,0 +1,96 @@
+"""Fake LLM service with injected latency and errors, for exercising the LLM resilience layer.
+
+Answers POST /generate with {"text": ...} and POST /stream with chunked text, in the
+format of the "http" LLM backend. Every request waits a base latency plus jitter; a
+fraction of requests take the slow tail latency instead, a fraction fails with 503 and
+a fraction hangs past any deadline. Point the backend at it with:
+
+    python scripts/fake_llm_server.py --latency-ms 400 --tail-ms 5000 --tail-rate 0.05 --error-rate 0.02
+    LLM_BACKEND=http LLM_HTTP_URL=http://127.0.0.1:8090 LLM_HEDGE_PERCENTILE=95 uvicorn app:app
+
+GET /stats reports how many requests took each path.
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI()
+settings = argparse.Namespace()
+counts = Counter()
+
+
+def reply_for(payload: dict) -> str:
+    last = "".join(payload["messages"][-1]["parts"])
+    digest = hashlib.sha256(last.encode()).hexdigest()[:8]
+    return f"Fake response {digest}. " + " ".join(["lorem"] * settings.reply_words)
+
+
+async def inject_fault():
+    """Sleeps for the sampled latency; returns an error response or None."""
+    roll = random.random()
+    if roll < settings.hang_rate:
+        counts["hang"] += 1
+        await asyncio.sleep(3600)
+    roll -= settings.hang_rate
+    if roll < settings.error_rate:
+        counts["error"] += 1
+        return JSONResponse({"detail": "injected failure"}, status_code=503)
+    roll -= settings.error_rate
+    if roll < settings.tail_rate:
+        counts["tail"] += 1
+        await asyncio.sleep(settings.tail_ms / 1000)
+    else:
+        counts["normal"] += 1
+        await asyncio.sleep(max(0.0, random.gauss(settings.latency_ms, settings.jitter_ms)) / 1000)
+    return None
+
+
+@app.post("/generate")
+async def generate(request: Request):
+    payload = await request.json()
+    error = await inject_fault()
+    if error is not None:
+        return error
+    return {"text": reply_for(payload)}
+
+
+@app.post("/stream")
+async def stream(request: Request):
+    payload = await request.json()
+    error = await inject_fault()
+    if error is not None:
+        return error
+
+    async def chunks():
+        for word in reply_for(payload).split(" "):
+            await asyncio.sleep(settings.chunk_interval_ms / 1000)
+            yield word + " "
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+@app.get("/stats")
+def stats():
+    return dict(counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=400)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--tail-ms", type=float, default=5000, help="latency of slow-tail requests")
+    parser.add_argument("--tail-rate", type=float, default=0.05, help="fraction of requests in the slow tail")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="fraction of requests that never answer")
+    parser.add_argument("--chunk-interval-ms", type=float, default=20)
+    parser.add_argument("--reply-words", type=int, default=40)
+    settings = parser.parse_args(namespace=settings)
+    uvicorn.run(app, host=settings.host, port=settings.port)
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from pkg.inference.batching import MicroBatcher
+from pkg.inference.executor import InferenceExecutor
+
+
+def test_concurrent_submits_share_one_batch():
+    async def scenario():
+        batches = []
+
+        def double(items: list) -> list:
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher("double", double, max_batch_size=8, max_wait_ms=50, executor=InferenceExecutor(max_workers=1))
+        try:
+            results = await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        finally:
+            await batcher.stop()
+        assert results == [0, 2, 4, 6, 8]
+        assert batches == [[0, 1, 2, 3, 4]]
+        assert batcher.metrics.snapshot()["items"] == 5
+
+    asyncio.run(scenario())
+
+
+def test_batch_failure_reaches_every_caller():
+    async def scenario():
+        def fail(items: list) -> list:
+            raise ValueError("broken model")
+
+        batcher = MicroBatcher("fail", fail, max_wait_ms=50, executor=InferenceExecutor(max_workers=1))
+        try:
+            results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        finally:
+            await batcher.stop()
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_full_batch_queue_rejects_with_503():
+    async def scenario():
+        batcher = MicroBatcher("echo", list, max_wait_ms=50, executor=InferenceExecutor(max_workers=1), max_queue=2)
+        # The batch worker only starts once these tasks yield, so the third item finds the queue full
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+        await batcher.stop()
+        assert results[:2] == [0, 1]
+        assert isinstance(results[2], HTTPException) and results[2].status_code == 503
+
+    asyncio.run(scenario())
+
+
+def test_executor_rejects_beyond_workers_and_queue():
+    async def scenario():
+        executor = InferenceExecutor(max_workers=1, max_queue=1)
+        release = threading.Event()
+        try:
+            running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)
+            assert executor.pending == 2 and executor.queue_depth == 1
+            with pytest.raises(HTTPException) as rejected:
+                await executor.run(release.wait)
+            assert rejected.value.status_code == 503
+        finally:
+            release.set()
+        await asyncio.gather(*running)
+        assert executor.pending == 0
+        executor.shutdown()
+
+    asyncio.run(scenario())
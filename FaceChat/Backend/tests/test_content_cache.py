@@ -0,0 +1,69 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from pkg.inference.cache import ContentCache
+
+
+def test_lru_eviction_is_bounded_by_bytes():
+    cache = ContentCache("test", max_bytes=3 * 400, ttl_seconds=60)
+    for key in "abc":
+        cache.set(key, np.zeros(100, dtype=np.float32))
+    assert cache.get("a") is not None
+    cache.set("d", np.zeros(100, dtype=np.float32))
+    # "b" is the least recently used once "a" was read
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.evictions == 1
+    assert cache.stats()["bytes"] == 3 * 400
+
+
+def test_expired_entries_are_dropped():
+    cache = ContentCache("test", max_bytes=1024, ttl_seconds=0)
+    cache.set("a", "value")
+    time.sleep(0.001)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_concurrent_lookups_compute_once():
+    async def scenario():
+        cache = ContentCache("test", max_bytes=1024, ttl_seconds=60)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(5)))
+        assert results == ["value"] * 5
+        assert len(calls) == 1
+        assert (cache.misses, cache.coalesced) == (1, 4)
+        assert await cache.get_or_compute("key", compute) == "value" and cache.hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_waiters():
+    async def scenario():
+        cache = ContentCache("test", max_bytes=1024, ttl_seconds=60)
+        started = asyncio.Event()
+
+        async def compute():
+            started.set()
+            await asyncio.sleep(0.01)
+            return "value"
+
+        leader = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await started.wait()
+        waiter = asyncio.ensure_future(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The waiter computes the value itself instead of inheriting the cancellation
+        assert await waiter == "value"
+        assert cache.get("key") == "value"
+
+    asyncio.run(scenario())
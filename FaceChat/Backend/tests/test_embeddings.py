@@ -0,0 +1,73 @@
+import struct
+import numpy as np
+import pytest
+from pkg.storage import embeddings
+from pkg.storage.embeddings import as_embedding, binary_copy_buffer, decode_embedding, encode_embedding
+
+SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+
+
+def read_fields(data: bytes) -> list:
+    """The rows of a binary COPY stream as lists of raw field bytes (None for NULL)."""
+    assert data[:11] == SIGNATURE
+    assert struct.unpack(">ii", data[11:19]) == (0, 0)
+    offset, rows = 19, []
+    while True:
+        (count,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        if count == -1:
+            assert offset == len(data)
+            return rows
+        row = []
+        for _ in range(count):
+            (length,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            row.append(None if length == -1 else data[offset:offset + length])
+            offset += max(length, 0)
+        rows.append(row)
+
+
+def test_binary_copy_encodes_scalars_and_nulls():
+    buffer = binary_copy_buffer([(7, 2 ** 40, "héllo", None)], ["int4", "int8", "text", "text"])
+    [row] = read_fields(buffer.read())
+    assert struct.unpack(">i", row[0]) == (7,)
+    assert struct.unpack(">q", row[1]) == (2 ** 40,)
+    assert row[2].decode("utf-8") == "héllo"
+    assert row[3] is None
+
+
+@pytest.mark.parametrize("storage, dtype", [("vector", ">f4"), ("halfvec", ">f2")])
+def test_binary_copy_encodes_embeddings_in_the_storage_type(monkeypatch, storage, dtype):
+    monkeypatch.setattr(embeddings, "EMBEDDING_STORAGE", storage)
+    values = np.array([0.5, -1.25, 3.0], dtype=np.float32)
+    [row] = read_fields(binary_copy_buffer([(values,)], ["embedding"]).read())
+    dim, unused = struct.unpack(">hh", row[0][:4])
+    assert (dim, unused) == (3, 0)
+    assert np.array_equal(np.frombuffer(row[0][4:], dtype=dtype), values)
+
+
+def test_binary_copy_rejects_unknown_kinds():
+    with pytest.raises(ValueError):
+        binary_copy_buffer([(1.5,)], ["float8"])
+
+
+def test_encoded_embeddings_round_trip_as_float32():
+    values = np.random.default_rng(0).normal(size=384).astype(np.float32)
+    decoded = decode_embedding(encode_embedding(values))
+    assert decoded.dtype == np.float32 and np.array_equal(decoded, values)
+    # States stored before embeddings were encoded hold float lists
+    assert np.array_equal(decode_embedding(values.tolist()), values)
+
+
+def test_as_embedding_does_not_copy_float32_arrays():
+    values = np.zeros((1, 4), dtype=np.float32)
+    assert np.shares_memory(as_embedding(values), values)
+
+
+def test_as_embedding_reads_halfvec_values():
+    class HalfVector:
+        def to_numpy(self):
+            return np.array([1.0, 2.0], dtype=np.float16)
+
+    result = as_embedding(HalfVector())
+    assert result.dtype == np.float32 and result.tolist() == [1.0, 2.0]
@@ -0,0 +1,87 @@
+import time
+from types import SimpleNamespace
+import numpy as np
+from pkg.recognition.identification_index import IdentificationIndex
+
+
+def unit(dim: int, axis: int) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[axis] = 1.0
+    return vector
+
+
+def user_row(user_id: int, face_axis: int, voice_axis: int = 0, voice_version: int = 1):
+    return SimpleNamespace(user_id=user_id, name=f"user-{user_id}", age=30, gender="n/a", contact="test",
+                           face_image=unit(8, face_axis), voice_sample=unit(2, voice_axis), voice_version=voice_version)
+
+
+def fake_load_rows(self, db: list, after_user_id: int, chunk_size: int = 10000) -> int:
+    """Reads the user rows of a list standing for the users table."""
+    rows = sorted((row for row in db if row.user_id > after_user_id), key=lambda row: row.user_id)
+    if rows:
+        self._add_rows(rows)
+    self._last_refresh = time.monotonic()
+    return len(rows)
+
+
+def index_with(rows: list) -> IdentificationIndex:
+    index = IdentificationIndex(face_dim=8, voice_dim=4, initial_capacity=1)
+    index._add_rows(rows)
+    return index
+
+
+def test_shortlist_returns_the_nearest_faces_first():
+    index = index_with([user_row(1, 0), user_row(2, 1), user_row(3, 2)])
+    probe = unit(8, 1) + 0.5 * unit(8, 2)
+    shortlist = index.shortlist(probe, top_k=2)
+    assert [detail[0] for _, _, _, detail in shortlist] == [2, 3]
+    assert shortlist[0][0] < shortlist[1][0]
+    assert shortlist[0][2].shape == (4,)
+    assert len(index.shortlist(probe, top_k=10)) == 3
+
+
+def test_search_compares_each_user_with_the_probe_of_its_version():
+    index = index_with([user_row(1, 0, voice_axis=0, voice_version=1), user_row(2, 0, voice_axis=1, voice_version=2)])
+    assert index.search(unit(8, 0), {1: unit(2, 0)})[0] == 1
+    assert index.search(unit(8, 0), {2: unit(2, 1)})[0] == 2
+    assert index.search(unit(8, 0), {3: unit(2, 0)}) is None
+
+
+def test_users_read_again_replace_their_row():
+    index = index_with([user_row(1, 0), user_row(2, 1)])
+    index._add_rows([user_row(1, 3)])
+    assert len(index) == 2
+    assert index.shortlist(unit(8, 3), top_k=1)[0][3][0] == 1
+
+
+def test_local_adds_do_not_move_the_database_watermark(monkeypatch):
+    monkeypatch.setattr(IdentificationIndex, "_load_rows", fake_load_rows)
+    table = [user_row(10, 0)]
+    index = IdentificationIndex(face_dim=8, voice_dim=4)
+    index.load(table)
+    # Another worker enrolls 11 while this one enrolls 12
+    table += [user_row(11, 1), user_row(12, 2)]
+    index.add(12, unit(8, 2), unit(2, 0), 1, (12, "user-12", 30, "n/a", "test"))
+    assert index.refresh(table) == 2
+    assert len(index) == 3
+
+
+def test_reload_drops_deleted_users(monkeypatch):
+    monkeypatch.setattr(IdentificationIndex, "_load_rows", fake_load_rows)
+    table = [user_row(1, 0), user_row(2, 1)]
+    index = IdentificationIndex(face_dim=8, voice_dim=4, reload_interval=1e-9)
+    index.load(table)
+    table.pop(0)
+    index.refresh(table)
+    assert len(index) == 1
+    assert index.search(unit(8, 0), {1: unit(2, 0)}) is None
+    assert index.search(unit(8, 1), {1: unit(2, 0)})[0] == 2
+
+
+def test_snapshot_returns_normalized_copies():
+    index = index_with([user_row(1, 0), user_row(2, 1)])
+    user_ids, faces, voices, voice_versions = index.snapshot()
+    assert user_ids.tolist() == [1, 2] and voice_versions.tolist() == [1, 1]
+    assert np.allclose(np.linalg.norm(faces, axis=1), 1.0) and voices.shape == (2, 4)
+    faces[:] = 0
+    assert index.search(unit(8, 0), {1: unit(2, 0)})[0] == 1
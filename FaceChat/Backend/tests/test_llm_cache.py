@@ -0,0 +1,50 @@
+import asyncio
+import hashlib
+import numpy as np
+from pkg.llm.client import LLMClient, StubBackend, user_message
+
+
+async def query_embedding(text: str) -> np.ndarray:
+    # Same text, same unit vector; different texts are nearly orthogonal
+    seed = int(hashlib.sha256(text.encode()).hexdigest()[:8], 16)
+    embedding = np.random.default_rng(seed).standard_normal(64).astype(np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+def prompt(user: str, query: str) -> list:
+    return [user_message(f"User Details for reference : name: {user}\n\nUser query: {query}")]
+
+
+def test_semantic_cache_is_not_shared_between_users():
+    async def scenario():
+        client = LLMClient("test", StubBackend(latency_ms=0), "model", "system", cache_mode="semantic")
+        client._embedding = query_embedding
+        query = "what is my name"
+        alice = await client.generate(prompt("Alice", query), cache_scope=[1, "Alice"], cache_query=query)
+        bob = await client.generate(prompt("Bob", query), cache_scope=[2, "Bob"], cache_query=query)
+        assert client.backend_calls == 2
+        assert alice != bob
+        # The same user asking again in a reworded prompt is still served from the semantic cache
+        assert await client.generate(prompt("Alice", query + "?"), cache_scope=[1, "Alice"], cache_query=query) == alice
+        assert client.semantic_cache.hits == 1
+        assert client.backend_calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_cancel_coalesced_requests():
+    async def scenario():
+        client = LLMClient("test", StubBackend(latency_ms=10), "model", "system", cache_mode="off")
+        messages = [user_message("hello")]
+        leader = asyncio.ensure_future(client.generate(messages))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(client.generate(messages))
+        await asyncio.sleep(0)
+        assert client.coalesced == 1
+        leader.cancel()
+        # The follower makes the call itself instead of inheriting the cancellation
+        assert (await follower).startswith("Stub response")
+        assert leader.cancelled()
+        assert client.backend_calls == 2
+
+    asyncio.run(scenario())
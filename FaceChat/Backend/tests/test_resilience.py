@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+from pkg.llm.resilience import CircuitBreaker, ResilientBackend
+
+
+class HangingBackend:
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        await asyncio.Event().wait()
+
+
+def test_cancelled_half_open_trial_releases_the_breaker():
+    async def scenario():
+        backend = ResilientBackend(HangingBackend(), "hanging")
+        # Opens on the first failure and is half-open right away
+        backend.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        backend.breaker.record_failure()
+        assert backend.breaker.state == "half_open"
+
+        trial = asyncio.ensure_future(backend.generate("model", "system", []))
+        await asyncio.sleep(0)
+        assert backend.breaker.acquire() is None
+
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        # Neither a success nor a failure: still half-open, and the next call is the trial
+        assert backend.breaker.state == "half_open"
+        assert backend.breaker._failures == 1
+        assert backend.breaker.acquire() is True
+
+    asyncio.run(scenario())
+
+
+class RejectingBackend:
+    async def generate(self, model_name: str, system_instruction: str, messages: list) -> str:
+        raise ValueError("invalid request")
+
+
+def test_non_retryable_error_leaves_a_half_open_breaker_undecided():
+    async def scenario():
+        backend = ResilientBackend(RejectingBackend(), "rejecting")
+        backend.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+        backend.breaker.record_failure()
+
+        with pytest.raises(ValueError):
+            await backend.generate("model", "system", [])
+        # The trial proved nothing: the breaker is not closed, and the next call is the trial
+        assert backend.breaker.state == "half_open"
+        assert backend.breaker._failures == 1
+        assert backend.breaker.acquire() is True
+
+    asyncio.run(scenario())
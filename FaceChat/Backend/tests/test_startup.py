@@ -0,0 +1,43 @@
+import asyncio
+import threading
+from pkg.lifecycle import startup
+
+
+def test_models_failing_for_good_marks_startup_failed_and_stops_database_steps(monkeypatch):
+    attempts = []
+    database_started = threading.Event()
+    database_released = threading.Event()
+
+    def load_models():
+        attempts.append(1)
+        raise RuntimeError("model download failed")
+
+    def create_schema():
+        # Stands for a database that does not answer yet
+        database_started.set()
+        database_released.wait(5)
+        raise ConnectionError("database unreachable")
+
+    monkeypatch.setattr(startup, "load_models", load_models)
+    monkeypatch.setattr(startup, "create_schema", create_schema)
+    monkeypatch.setattr(startup, "SCHEMA_AUTO_CREATE", True)
+    monkeypatch.setattr(startup, "IDENTIFICATION_INDEX_ENABLED", False)
+    monkeypatch.setattr(startup, "STARTUP_MODE", "background")
+    monkeypatch.setattr(startup, "STARTUP_RETRY_SECONDS", 0)
+    monkeypatch.setattr(startup, "STARTUP_MODEL_ATTEMPTS", 2)
+
+    async def scenario():
+        state = startup.StartupState()
+        try:
+            await asyncio.wait_for(state.start(), 5)
+        finally:
+            database_released.set()
+        return state
+
+    state = asyncio.run(scenario())
+    assert len(attempts) == 2
+    assert state.failed and not state.ready
+    assert state.steps["models"]["status"] == "failed"
+    # The database step was cancelled instead of retrying on its own
+    assert database_started.is_set()
+    assert state.steps["schema"]["status"] == "running"